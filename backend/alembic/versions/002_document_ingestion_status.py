@@ -0,0 +1,35 @@
+"""Document ingestion status
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'))
+    op.add_column('documents', sa.Column('task_id', sa.String(length=255), nullable=True))
+    op.add_column('documents', sa.Column('processing_attempts', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('documents', sa.Column('processing_started_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_documents_status'), 'documents', ['status'], unique=False)
+    
+    # Backfill status for documents processed before the queue existed
+    op.execute("UPDATE documents SET status = 'completed' WHERE is_processed = true")
+    op.execute("UPDATE documents SET status = 'failed' WHERE is_processed = false AND processing_error IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_documents_status'), table_name='documents')
+    op.drop_column('documents', 'processing_started_at')
+    op.drop_column('documents', 'processing_attempts')
+    op.drop_column('documents', 'task_id')
+    op.drop_column('documents', 'status')
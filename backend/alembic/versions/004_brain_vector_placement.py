@@ -0,0 +1,26 @@
+"""Brain vector placement
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL means the brain lives in the shared collection
+    op.add_column('brains', sa.Column('vector_collection', sa.String(length=255), nullable=True))
+    op.add_column('brains', sa.Column('vector_shard_key', sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('brains', 'vector_shard_key')
+    op.drop_column('brains', 'vector_collection')
@@ -0,0 +1,24 @@
+"""Brain vector backend
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL means the brain's vectors are in Qdrant
+    op.add_column('brains', sa.Column('vector_backend', sa.String(length=20), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('brains', 'vector_backend')
@@ -0,0 +1,25 @@
+"""Chat session rolling summary
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_sessions', 'summary_message_id')
+    op.drop_column('chat_sessions', 'summary')
@@ -0,0 +1,27 @@
+"""Chat messages session/created_at index
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_chat_messages_session_id_created_at',
+        'chat_messages',
+        ['session_id', 'created_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_session_id_created_at', table_name='chat_messages')
@@ -1,69 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_
+from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
 from app.models.models import Brain, User, Role, Department, Team, BrainVisibility
 from app.schemas.schemas import BrainCreate, BrainUpdate, BrainResponse
 from app.api.deps import get_current_user
 from app.services.vector_store import vector_store
+from app.services.lexical_index import lexical_index
+from app.services.answer_cache import brain_versions
 
 router = APIRouter()
 
 
 async def check_brain_access(brain: Brain, user: User, db: AsyncSession) -> bool:
-    """Check if user has access to brain."""
-    # Owner always has access
+    """Check if user has access to brain.
+    
+    Loads whatever the brain's visibility depends on (its assignments and,
+    for role visibility, the user's roles) and applies _has_access.
+    """
+    user_role_ids = set()
+    if brain.visibility in (BrainVisibility.ROLE, BrainVisibility.DEPARTMENT, BrainVisibility.TEAM):
+        result = await db.execute(
+            select(Brain)
+            .options(
+                selectinload(Brain.assigned_roles),
+                selectinload(Brain.assigned_departments),
+                selectinload(Brain.assigned_teams)
+            )
+            .where(Brain.id == brain.id)
+        )
+        brain = result.scalar_one()
+        
+        if brain.visibility == BrainVisibility.ROLE:
+            result = await db.execute(
+                select(User).options(selectinload(User.roles)).where(User.id == user.id)
+            )
+            user_role_ids = {role.id for role in result.scalar_one().roles}
+    
+    return _has_access(brain, user, user_role_ids)
+
+
+def _has_access(brain: Brain, user: User, user_role_ids: set) -> bool:
+    """Access rules for a brain whose assignments are already loaded."""
     if brain.owner_id == user.id:
         return True
     
-    # Superuser has access to all brains in organization
     if user.is_superuser and brain.organization_id == user.organization_id:
         return True
     
-    # Check visibility settings
     if brain.visibility == BrainVisibility.ORGANIZATION:
         return brain.organization_id == user.organization_id
-    
     elif brain.visibility == BrainVisibility.ROLE:
-        # Load user roles
-        result = await db.execute(
-            select(User).options(selectinload(User.roles)).where(User.id == user.id)
-        )
-        user_with_roles = result.scalar_one()
-        user_role_ids = [role.id for role in user_with_roles.roles]
-        
-        # Load brain roles
-        result = await db.execute(
-            select(Brain).options(selectinload(Brain.assigned_roles)).where(Brain.id == brain.id)
-        )
-        brain_with_roles = result.scalar_one()
-        brain_role_ids = [role.id for role in brain_with_roles.assigned_roles]
-        
-        return any(role_id in brain_role_ids for role_id in user_role_ids)
-    
+        return any(role.id in user_role_ids for role in brain.assigned_roles)
     elif brain.visibility == BrainVisibility.DEPARTMENT:
-        if user.department_id:
-            result = await db.execute(
-                select(Brain).options(selectinload(Brain.assigned_departments)).where(Brain.id == brain.id)
-            )
-            brain_with_depts = result.scalar_one()
-            dept_ids = [dept.id for dept in brain_with_depts.assigned_departments]
-            return user.department_id in dept_ids
-    
+        return bool(user.department_id) and any(dept.id == user.department_id for dept in brain.assigned_departments)
     elif brain.visibility == BrainVisibility.TEAM:
-        if user.team_id:
-            result = await db.execute(
-                select(Brain).options(selectinload(Brain.assigned_teams)).where(Brain.id == brain.id)
-            )
-            brain_with_teams = result.scalar_one()
-            team_ids = [team.id for team in brain_with_teams.assigned_teams]
-            return user.team_id in team_ids
+        return bool(user.team_id) and any(team.id == user.team_id for team in brain.assigned_teams)
     
     return False
 
 
+async def get_accessible_brains(
+    user: User,
+    db: AsyncSession,
+    brain_ids: Optional[List[int]] = None
+) -> List[Brain]:
+    """Active brains in the user's organization the user can access.
+    
+    Access is checked in bulk: brains, their assignments and the user's
+    roles are loaded in a fixed number of queries. ``brain_ids`` restricts
+    the candidates.
+    """
+    query = (
+        select(Brain)
+        .options(
+            selectinload(Brain.assigned_roles),
+            selectinload(Brain.assigned_departments),
+            selectinload(Brain.assigned_teams)
+        )
+        .where(
+            and_(
+                Brain.organization_id == user.organization_id,
+                Brain.is_active == True
+            )
+        )
+    )
+    if brain_ids is not None:
+        query = query.where(Brain.id.in_(brain_ids))
+    result = await db.execute(query)
+    brains = result.scalars().all()
+    
+    result = await db.execute(
+        select(User).options(selectinload(User.roles)).where(User.id == user.id)
+    )
+    user_role_ids = {role.id for role in result.scalar_one().roles}
+    
+    return [brain for brain in brains if _has_access(brain, user, user_role_ids)]
+
+
 @router.post("", response_model=BrainResponse, status_code=status.HTTP_201_CREATED)
 async def create_brain(
     brain_data: BrainCreate,
@@ -80,6 +116,12 @@ async def create_brain(
         owner_id=current_user.id
     )
     
+    # Record where this brain's vectors will live
+    placement = vector_store.qdrant.placement_for(current_user.organization_id)
+    brain.vector_backend = vector_store.backend_for_new_brain()
+    brain.vector_collection = placement.collection_name
+    brain.vector_shard_key = placement.shard_key
+    
     db.add(brain)
     await db.flush()
     
@@ -144,30 +186,7 @@ async def list_brains(
     db: AsyncSession = Depends(get_db)
 ):
     """List all brains accessible to current user."""
-    # Get all brains in organization
-    result = await db.execute(
-        select(Brain)
-        .options(
-            selectinload(Brain.assigned_roles),
-            selectinload(Brain.assigned_departments),
-            selectinload(Brain.assigned_teams)
-        )
-        .where(
-            and_(
-                Brain.organization_id == current_user.organization_id,
-                Brain.is_active == True
-            )
-        )
-    )
-    all_brains = result.scalars().all()
-    
-    # Filter based on access
-    accessible_brains = []
-    for brain in all_brains:
-        if await check_brain_access(brain, current_user, db):
-            accessible_brains.append(brain)
-    
-    return accessible_brains
+    return await get_accessible_brains(current_user, db)
 
 
 @router.get("/{brain_id}", response_model=BrainResponse)
@@ -276,6 +295,8 @@ async def update_brain(
     
     await db.commit()
     await db.refresh(brain)
+    # Brain settings change how answers are retrieved
+    await brain_versions.bump(brain.id)
     
     # Load relationships
     result = await db.execute(
@@ -316,10 +337,12 @@ async def delete_brain(
         )
     
     # Delete vectors from vector store
-    vector_store.delete_by_brain(brain_id)
+    await vector_store.delete_by_brain(brain_id)
+    await lexical_index.delete_by_brain(brain_id)
     
     # Delete brain
     await db.delete(brain)
     await db.commit()
+    await brain_versions.bump(brain_id)
     
     return None
@@ -1,30 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+import anyio
+from contextlib import aclosing
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
-from typing import List
-from app.db.session import get_db
+from typing import List, Dict, Any, NamedTuple, Optional
+from app.db.session import get_db, AsyncSessionLocal
 from app.models.models import ChatSession, ChatMessage, Brain, User
 from app.schemas.schemas import (
     ChatRequest, ChatResponse, ChatMessageResponse,
-    ChatSessionResponse, SearchRequest, SearchResponse, SearchResult
+    ChatSessionResponse, SearchRequest, SearchResponse, SearchResult,
+    FederatedSearchRequest
 )
-from app.api.deps import get_current_user
-from app.api.v1.brains import check_brain_access
+from app.api.deps import get_current_user, get_current_superuser
+from app.api.v1.brains import check_brain_access, get_accessible_brains
 from app.services.llm_service import llm_service
+from app.services.context_packer import context_packer
+from app.services.conversation_summary import conversation_summarizer
+from app.services.chat_history import load_recent_messages
+from app.services.answer_cache import answer_cache
+from app.core.config import settings
 from app.services.embeddings import embedding_service
+from app.services.retrieval import hybrid_search, federated_search
 from app.services.vector_store import vector_store
 
 router = APIRouter()
 
+# Payload fields returned by /search when the request does not set fields
+DEFAULT_SEARCH_FIELDS = ["content", "page"]
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(
+
+class ChatStart(NamedTuple):
+    brain: Brain
+    session: ChatSession
+    history: List[Dict[str, str]]  # Messages not yet folded into the session summary
+    needs_title: bool  # Whether a title should be generated (see update_session_title)
+
+
+async def start_chat(
     chat_data: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """Chat with a brain."""
+    current_user: User,
+    db: AsyncSession
+) -> ChatStart:
+    """Check access, load or create the session and save the user message.
+    
+    Untitled sessions get a fallback title from the message.
+    """
     # Check brain access
     result = await db.execute(select(Brain).where(Brain.id == chat_data.brain_id))
     brain = result.scalar_one_or_none()
@@ -45,7 +68,6 @@ async def chat(
     if chat_data.session_id:
         result = await db.execute(
             select(ChatSession)
-            .options(selectinload(ChatSession.messages))
             .where(
                 ChatSession.id == chat_data.session_id,
                 ChatSession.user_id == current_user.id,
@@ -59,6 +81,14 @@ async def chat(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Chat session not found"
             )
+        
+        # Get the tail of the chat history not covered by the summary
+        chat_history = await load_recent_messages(
+            db,
+            session.id,
+            settings.CHAT_HISTORY_MAX_MESSAGES,
+            after_id=session.summary_message_id
+        )
     else:
         # Create new session
         session = ChatSession(
@@ -67,6 +97,7 @@ async def chat(
         )
         db.add(session)
         await db.flush()
+        chat_history = []
     
     # Save user message
     user_message = ChatMessage(
@@ -75,38 +106,77 @@ async def chat(
         content=chat_data.message
     )
     db.add(user_message)
+    
+    needs_title = not session.title
+    if needs_title:
+        session.title = llm_service.fallback_chat_title(chat_data.message)
+    
     await db.commit()
     
-    # Get chat history
-    chat_history = [
-        {"role": msg.role, "content": msg.content}
-        for msg in session.messages[-10:]  # Last 10 messages
-    ]
+    return ChatStart(brain, session, chat_history, needs_title)
+
+
+async def update_session_title(session_id: int, first_message: str, fallback_title: str):
+    """Replace a session's fallback title with a generated one.
+    
+    Runs as a background task after the response is sent, so the title
+    LLM call is off the chat latency path.
+    """
+    title = await llm_service.generate_chat_title(first_message)
+    if title == "New Chat":
+        # Generation failed; the fallback is more descriptive
+        return
+    
+    async with AsyncSessionLocal() as db:
+        # Only replace the fallback; never overwrite a title set meanwhile
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id, ChatSession.title == fallback_title)
+            .values(title=title)
+        )
+        await db.commit()
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    chat_data: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Chat with a brain."""
+    brain, session, chat_history, needs_title = await start_chat(chat_data, current_user, db)
     
     # Generate response using RAG
     response_data = await llm_service.generate_response(
         query=chat_data.message,
         brain_id=chat_data.brain_id,
-        chat_history=chat_history
+        chat_history=chat_history,
+        brain_settings=brain.settings,
+        summary=session.summary
     )
     
     # Save assistant message
+    metadata = {"tokens": response_data["tokens"]}
+    if response_data.get("cached"):
+        metadata["cached"] = True
     assistant_message = ChatMessage(
         session_id=session.id,
         role="assistant",
         content=response_data["answer"],
-        sources=response_data["sources"]
+        sources=response_data["sources"],
+        msg_metadata=metadata
     )
     db.add(assistant_message)
-    
-    # Generate title for new session
-    if not session.title:
-        title = await llm_service.generate_chat_title(chat_data.message)
-        session.title = title
-    
     await db.commit()
     await db.refresh(assistant_message)
     
+    # Generate title for new session and compact long history after responding
+    if needs_title:
+        background_tasks.add_task(update_session_title, session.id, chat_data.message, session.title)
+    if conversation_summarizer.should_compact(chat_history):
+        background_tasks.add_task(conversation_summarizer.compact, session.id)
+    
     # Get source documents
     from app.models.models import Document
     doc_ids = [s["document_id"] for s in response_data["sources"]]
@@ -124,6 +194,112 @@ async def chat(
     }
 
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    chat_data: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Chat with a brain, streaming the answer as Server-Sent Events.
+    
+    Events, in order: ``session`` (session_id), ``sources`` (retrieved
+    sources), ``delta`` (answer text, repeated) and ``done`` (message_id),
+    or ``error`` if generation fails. The assistant message is saved when
+    the stream ends; if the client disconnects, the partial answer is
+    saved with ``incomplete`` set in its metadata.
+    """
+    brain, session, chat_history, needs_title = await start_chat(chat_data, current_user, db)
+    session_id = session.id
+    summary = session.summary
+    brain_settings = brain.settings
+    
+    # Generate title for new session and compact long history once the stream ends
+    if needs_title:
+        background_tasks.add_task(update_session_title, session_id, chat_data.message, session.title)
+    if conversation_summarizer.should_compact(chat_history):
+        background_tasks.add_task(conversation_summarizer.compact, session_id)
+    
+    async def save_answer(
+        answer: str,
+        sources: List[Dict[str, Any]],
+        tokens: Dict[str, int],
+        completed: bool,
+        cached: bool
+    ) -> Optional[int]:
+        if cached:
+            metadata = {"tokens": tokens, "cached": True}
+        else:
+            metadata = {"tokens": {**tokens, "completion_tokens": context_packer.count(answer)}}
+        if not completed:
+            metadata["incomplete"] = True
+        
+        # The request's db session is closed once streaming starts
+        async with AsyncSessionLocal() as stream_db:
+            assistant_message = ChatMessage(
+                session_id=session_id,
+                role="assistant",
+                content=answer,
+                sources=sources,
+                msg_metadata=metadata
+            )
+            stream_db.add(assistant_message)
+            await stream_db.commit()
+            return assistant_message.id
+    
+    async def events():
+        answer_parts = []
+        sources = []
+        tokens = {}
+        cached = False
+        completed = False
+        error = None
+        try:
+            yield sse_event("session", {"session_id": session_id})
+            # aclosing() stops the completion as soon as this generator is cancelled
+            async with aclosing(llm_service.stream_response(
+                query=chat_data.message,
+                brain_id=chat_data.brain_id,
+                chat_history=chat_history,
+                brain_settings=brain_settings,
+                summary=summary
+            )) as stream:
+                async for event in stream:
+                    if event["type"] == "sources":
+                        sources = event["sources"]
+                        tokens = event["tokens"]
+                        cached = event.get("cached", False)
+                        yield sse_event("sources", {"sources": sources, "cached": cached})
+                    else:
+                        answer_parts.append(event["content"])
+                        yield sse_event("delta", {"content": event["content"]})
+            completed = True
+        except Exception as e:
+            error = str(e)
+        finally:
+            message_id = None
+            if completed or answer_parts:
+                # Shielded so a client disconnect cannot cancel the save
+                with anyio.CancelScope(shield=True):
+                    message_id = await save_answer("".join(answer_parts), sources, tokens, completed, cached)
+        
+        if error is not None:
+            yield sse_event("error", {"detail": error})
+        else:
+            yield sse_event("done", {"message_id": message_id})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/sessions", response_model=List[ChatSessionResponse])
 async def list_sessions(
     brain_id: int = None,
@@ -197,6 +373,35 @@ async def delete_session(
     return None
 
 
+async def build_search_results(
+    search_results: List[Dict[str, Any]],
+    fields: Optional[List[str]],
+    db: AsyncSession
+) -> List[Dict[str, Any]]:
+    """Attach documents to search hits, loading them in one query."""
+    from app.models.models import Document
+    doc_ids = {result_item["payload"]["document_id"] for result_item in search_results}
+    result = await db.execute(select(Document).where(Document.id.in_(doc_ids)))
+    documents = {document.id: document for document in result.scalars().all()}
+    results = []
+    
+    for result_item in search_results:
+        payload = result_item["payload"]
+        document = documents.get(payload["document_id"])
+        
+        if document:
+            results.append({
+                "document": document,
+                "score": result_item["score"],
+                "rank_score": result_item.get("rank_score"),
+                "content": payload.get("content"),
+                "page": payload.get("page"),
+                "payload": {k: payload[k] for k in fields if k in payload} if fields is not None else None
+            })
+    
+    return results
+
+
 @router.post("/search", response_model=SearchResponse)
 async def search(
     search_data: SearchRequest,
@@ -223,34 +428,68 @@ async def search(
     # Create embedding for search query
     query_embedding = await embedding_service.create_embedding(search_data.query)
     
-    # Search in vector store
-    search_results = vector_store.search(
+    # Search in vector store, reading only the requested payload fields
+    fields = search_data.fields if search_data.fields is not None else DEFAULT_SEARCH_FIELDS
+    search_results = await hybrid_search(
+        query=search_data.query,
         query_vector=query_embedding,
         brain_id=search_data.brain_id,
         limit=search_data.limit,
-        score_threshold=0.5
+        score_threshold=0.5,
+        brain_settings=brain.settings,
+        payload_fields=list(dict.fromkeys(fields + ["document_id"]))
     )
     
-    # Get document info
-    from app.models.models import Document
-    results = []
+    return {
+        "results": await build_search_results(search_results, search_data.fields, db),
+        "query": search_data.query
+    }
+
+
+@router.post("/search/federated", response_model=SearchResponse)
+async def search_federated(
+    search_data: FederatedSearchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search several brains, or every accessible brain, in one request."""
+    # Check brain access in bulk
+    brains = await get_accessible_brains(current_user, db, search_data.brain_ids)
     
-    for result_item in search_results:
-        payload = result_item["payload"]
-        doc_id = payload["document_id"]
-        
-        result = await db.execute(select(Document).where(Document.id == doc_id))
-        document = result.scalar_one_or_none()
-        
-        if document:
-            results.append({
-                "document": document,
-                "score": result_item["score"],
-                "content": payload["content"],
-                "page": payload.get("page")
-            })
+    if search_data.brain_ids is not None and len(brains) < len(set(search_data.brain_ids)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Brain rows already carry their vector routes
+    vector_store.prime_routes(brains)
+    
+    # Create embedding for search query
+    query_embedding = await embedding_service.create_embedding(search_data.query)
+    
+    fields = search_data.fields if search_data.fields is not None else DEFAULT_SEARCH_FIELDS
+    search_results = await federated_search(
+        query=search_data.query,
+        query_vector=query_embedding,
+        brain_ids=[brain.id for brain in brains],
+        limit=search_data.limit,
+        score_threshold=0.5,
+        payload_fields=list(dict.fromkeys(fields + ["document_id"]))
+    )
     
     return {
-        "results": results,
+        "results": await build_search_results(search_results, search_data.fields, db),
         "query": search_data.query
     }
+
+
+@router.get("/cache/stats")
+async def cache_stats(
+    current_user: User = Depends(get_current_superuser)
+):
+    """Hit rates and sizes of the answer and embedding caches (superuser only)."""
+    return {
+        "answer_cache": answer_cache.get_stats(),
+        "embedding_cache": embedding_service.cache.get_stats() if embedding_service.cache else None
+    }
@@ -1,75 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import select, update
+from typing import List, Optional
 from pathlib import Path
+import logging
+import uuid
 from app.db.session import get_db
-from app.models.models import Document, Brain, User
+from app.models.models import Document, DocumentStatus, Brain, User
 from app.schemas.schemas import DocumentResponse
 from app.api.deps import get_current_user
 from app.api.v1.brains import check_brain_access
-from app.services.document_processor import document_processor
+from app.services.document_processor import document_processor, FileTooLargeError
 from app.services.vector_store import vector_store
+from app.services.lexical_index import lexical_index
+from app.services.answer_cache import brain_versions
 from app.core.config import settings
+from app.worker.tasks import process_document_task
 
-router = APIRouter()
-
+logger = logging.getLogger(__name__)
 
-async def process_document_background(
-    document_id: int,
-    file_path: str,
-    file_type: str,
-    brain_id: int,
-    db_url: str
-):
-    """Background task to process document."""
-    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-    from sqlalchemy.orm import sessionmaker
-    
-    engine = create_async_engine(db_url)
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    
-    async with async_session() as db:
-        try:
-            result = await db.execute(select(Document).where(Document.id == document_id))
-            document = result.scalar_one_or_none()
-            
-            if document:
-                # Process document
-                vector_ids = await document_processor.process_document(
-                    file_path=file_path,
-                    file_type=file_type,
-                    brain_id=brain_id,
-                    document_id=document_id,
-                    metadata={
-                        "filename": document.original_filename,
-                        "source": document.source
-                    }
-                )
-                
-                # Update document
-                document.vector_ids = vector_ids
-                document.is_processed = True
-                await db.commit()
-        except Exception as e:
-            # Update document with error
-            result = await db.execute(select(Document).where(Document.id == document_id))
-            document = result.scalar_one_or_none()
-            if document:
-                document.processing_error = str(e)
-                await db.commit()
+router = APIRouter()
 
 
 @router.post("/{brain_id}/documents", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
     brain_id: int,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    replace_document_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Upload document to brain."""
+    """Upload document to brain.
+    
+    With ``replace_document_id`` the upload becomes a new version of that
+    document (brain owner only); only changed chunks are re-embedded when
+    it is processed. Otherwise a new document is created, whatever its
+    filename. If processing cannot be queued the document is returned
+    marked failed, and uploading the file again retries it.
+    """
     # Check brain access
     result = await db.execute(select(Brain).where(Brain.id == brain_id))
     brain = result.scalar_one_or_none()
@@ -86,13 +54,29 @@ async def upload_document(
             detail="Access denied"
         )
     
-    # Validate file size
-    file_content = await file.read()
-    if len(file_content) > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Max size: {settings.MAX_UPLOAD_SIZE} bytes"
+    # Document this upload replaces, if any
+    document = None
+    if replace_document_id is not None:
+        if brain.owner_id != current_user.id and not current_user.is_superuser:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only brain owner can replace documents"
+            )
+        
+        result = await db.execute(
+            select(Document).where(
+                Document.id == replace_document_id,
+                Document.brain_id == brain_id,
+                Document.source == "upload"
+            )
         )
+        document = result.scalar_one_or_none()
+        
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
     
     # Get file type
     file_extension = Path(file.filename).suffix.lower().replace(".", "")
@@ -104,33 +88,83 @@ async def upload_document(
             detail=f"File type not supported. Allowed: {', '.join(allowed_types)}"
         )
     
-    # Save file
-    file_path = await document_processor.save_file(file_content, file.filename, brain_id)
-    
-    # Create document record
-    document = Document(
-        brain_id=brain_id,
-        filename=Path(file_path).name,
-        original_filename=file.filename,
-        file_type=file_extension,
-        file_path=file_path,
-        file_size=len(file_content),
-        source="upload"
+    # Copy the spooled upload to disk, enforcing the size limit
+    try:
+        file_path, file_size, content_hash = await document_processor.save_upload(file, brain_id)
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Max size: {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+    
+    # Identical content already in this brain: nothing to re-process
+    result = await db.execute(
+        select(Document)
+        .where(
+            Document.brain_id == brain_id,
+            Document.content_hash == content_hash,
+            Document.status != DocumentStatus.FAILED.value
+        )
+        .limit(1)
     )
+    duplicate = result.scalar_one_or_none()
+    
+    if duplicate:
+        await document_processor.delete_file(file_path)
+        return duplicate
+    
+    if document:
+        # Tasks still queued for the old version see the new task_id and exit
+        await document_processor.delete_file(document.file_path)
+        document.filename = Path(file_path).name
+        document.original_filename = file.filename
+        document.file_type = file_extension
+        document.file_path = file_path
+        document.file_size = file_size
+        document.content_hash = content_hash
+        document.is_processed = False
+        document.processing_error = None
+        document.processing_attempts = 0
+        document.status = DocumentStatus.QUEUED.value
+        document.task_id = str(uuid.uuid4())
+    else:
+        # Create document record
+        document = Document(
+            brain_id=brain_id,
+            filename=Path(file_path).name,
+            original_filename=file.filename,
+            file_type=file_extension,
+            file_path=file_path,
+            file_size=file_size,
+            content_hash=content_hash,
+            source="upload",
+            status=DocumentStatus.QUEUED.value,
+            task_id=str(uuid.uuid4())
+        )
+        db.add(document)
     
-    db.add(document)
     await db.commit()
     await db.refresh(document)
     
-    # Process document in background
-    background_tasks.add_task(
-        process_document_background,
-        document.id,
-        file_path,
-        file_extension,
-        brain_id,
-        str(settings.DATABASE_URL)
-    )
+    # Queue document for processing by an ingestion worker
+    try:
+        process_document_task.apply_async(
+            args=[document.id, brain.organization_id],
+            task_id=document.task_id
+        )
+    except Exception as e:
+        # Broker unavailable: no task will ever pick the document up
+        logger.exception("Could not queue document %s for processing", document.id)
+        await db.execute(
+            update(Document)
+            .where(Document.id == document.id, Document.task_id == document.task_id)
+            .values(
+                status=DocumentStatus.FAILED.value,
+                processing_error=f"Could not queue document for processing: {e}"
+            )
+        )
+        await db.commit()
+        await db.refresh(document)
     
     return document
 
@@ -207,7 +241,8 @@ async def delete_document(
         )
     
     # Delete from vector store
-    vector_store.delete_by_document(document_id)
+    await vector_store.delete_by_document(brain_id, document_id)
+    await lexical_index.delete_by_document(brain_id, document_id)
     
     # Delete file
     await document_processor.delete_file(document.file_path)
@@ -215,5 +250,6 @@ async def delete_document(
     # Delete document record
     await db.delete(document)
     await db.commit()
+    await brain_versions.bump(brain_id)
     
     return None
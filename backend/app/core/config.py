@@ -19,6 +19,20 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Celery / Ingestion Queue
+    CELERY_BROKER_URL: Optional[str] = None  # Defaults to REDIS_URL; "memory://" for tests
+    CELERY_RESULT_BACKEND: Optional[str] = None
+    INGESTION_MAX_ATTEMPTS: int = 3
+    INGESTION_FLUSH_BATCH_SIZE: int = 256  # Chunks embedded and upserted per flush
+    INGESTION_RETRY_BACKOFF: int = 10  # Seconds before the first retry, doubled per attempt
+    INGESTION_RETRY_BACKOFF_MAX: int = 600
+    INGESTION_MAX_CONCURRENCY_PER_ORG: int = 2  # 0 disables the limit
+    INGESTION_ORG_WAIT_SECONDS: int = 5  # Requeue delay when an organization is at its limit
+    INGESTION_VISIBILITY_TIMEOUT: int = 3600
+    INGESTION_LEASE_TTL: int = 120  # Seconds a concurrency slot outlives its last heartbeat
+    INGESTION_WORKER_CONCURRENCY: int = 2  # Worker processes per ingestion worker node
+    INGESTION_DB_MAX_CONNECTIONS: int = 10  # Total DB connections across a node's worker processes
+    
     # JWT Settings
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -42,6 +56,36 @@ class Settings(BaseSettings):
     QDRANT_PORT: int = 6333
     QDRANT_API_KEY: Optional[str] = None
     QDRANT_COLLECTION_NAME: str = "aura_documents"
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_TIMEOUT: int = 30  # Default request timeout in seconds
+    QDRANT_SEARCH_TIMEOUT: int = 5  # Per-search timeout in seconds
+    QDRANT_MAX_CONNECTIONS: int = 100  # REST connection pool size
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_ON_DISK_PAYLOAD: bool = True  # Keep payloads (chunk text) on disk
+    QDRANT_UPSERT_BATCH_SIZE: int = 256  # Max points per upsert request
+    QDRANT_UPSERT_BATCH_BYTES: int = 8 * 1024 * 1024  # Max estimated upsert request size
+    QDRANT_UPSERT_CONCURRENCY: int = 4  # Upsert requests in flight per add
+    QDRANT_QUANTIZATION: str = "none"  # none, scalar (int8) or binary; originals kept on disk
+    QDRANT_QUANTIZATION_QUANTILE: float = 0.99
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0  # Candidates fetched per result before rescoring
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_SEARCH_HNSW_EF: Optional[int] = None  # None uses Qdrant's default
+    QDRANT_PLACEMENT_STRATEGY: str = "shared"  # shared, organization or shard_key (for new brains)
+    QDRANT_ROUTE_CACHE_TTL: int = 300  # Seconds a brain->collection route is cached in process
+    
+    # Local Vector Index (brute-force NumPy backend for small brains)
+    VECTOR_LOCAL_MAX_VECTORS: int = 0  # New brains stay local up to this size; 0 (default) disables
+    VECTOR_LOCAL_DIR: Path = Path("./vector_index")  # Must be shared by all API and worker processes
+    VECTOR_LOCAL_CACHE_BRAINS: int = 32  # Brains whose vector matrices each process keeps in memory
+    
+    # Hybrid Retrieval (BM25 + dense, fused with reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATE_MULTIPLIER: int = 3  # Candidates fetched from each retriever per result
+    HYBRID_LEXICAL_MIN_SCORE: float = 0.5  # Cosine similarity a lexical-only hit needs to be kept
+    LEXICAL_INDEX_DIR: Path = Path("./lexical_index")
     
     # Google Drive API
     GOOGLE_CLIENT_ID: str
@@ -63,15 +107,51 @@ class Settings(BaseSettings):
     # File Upload
     MAX_UPLOAD_SIZE: int = 52428800  # 50MB
     UPLOAD_DIR: Path = Path("./uploads")
+    UPLOAD_CHUNK_SIZE: int = 1048576  # 1MB read/write chunks when streaming uploads
+    
+    # Text Extraction
+    EXTRACTION_WORKERS: int = 2  # Process pool size; 0 runs extraction in a thread
+    EXTRACTION_MAX_TASKS_PER_CHILD: int = 50  # Recycle pool processes after this many tasks
+    EXTRACTION_PDF_PAGES_PER_TASK: int = 10
+    EXTRACTION_TEXT_BLOCK_SIZE: int = 1048576  # Characters read per block from text files
+    
+    # Chunking (overridable per brain via Brain.settings)
+    CHUNK_TOKENS: int = 300
+    CHUNK_OVERLAP_TOKENS: int = 50
     
     # Embedding Model
     EMBEDDING_MODEL: str = "text-embedding-ada-002"
     EMBEDDING_DIMENSION: int = 1536
+    EMBEDDING_BATCH_SIZE: int = 256  # Max texts per embeddings request
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # Max tokens per embeddings request
+    EMBEDDING_BATCH_CONCURRENCY: int = 4  # Batches in flight per document
+    EMBEDDING_MICROBATCH_WAIT_MS: float = 5.0  # Window to collect query texts (0 disables)
+    EMBEDDING_MICROBATCH_MAX_SIZE: int = 64  # Flush early once this many texts are pending
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_BYTES: int = 67108864  # 64MB in-process LRU tier
+    EMBEDDING_CACHE_REDIS_ENABLED: bool = True
+    EMBEDDING_CACHE_TTL_SECONDS: int = 2592000  # 30 days in Redis
     
     # LLM Settings
     LLM_MODEL: str = "gpt-4-turbo-preview"
     LLM_TEMPERATURE: float = 0.7
     MAX_TOKENS: int = 2000
+    LLM_CONTEXT_BUDGET: int = 6000  # Prompt tokens: system prompt + history + context + question
+    LLM_HISTORY_BUDGET: int = 1500  # Max prompt tokens spent on chat history
+    CHAT_HISTORY_MAX_MESSAGES: int = 20  # Most recent messages loaded per chat turn
+    
+    # Semantic Answer Cache (standalone questions, per brain)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MIN_SIMILARITY: float = 0.97  # Cosine similarity needed to reuse an answer
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000
+    ANSWER_CACHE_MAX_ENTRIES_PER_BRAIN: int = 200
+    
+    # Conversation Summaries
+    CHAT_SUMMARY_TRIGGER_TOKENS: int = 1500  # Unsummarized history size that triggers compaction
+    CHAT_SUMMARY_KEEP_TOKENS: int = 600  # Most recent history kept verbatim when compacting
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_SUMMARY_MODEL: str = "gpt-3.5-turbo"
     
     class Config:
         env_file = ".env"
@@ -18,6 +18,25 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Bounded engine for ingestion workers. Each worker process gets an equal
+# share of INGESTION_DB_MAX_CONNECTIONS and never overflows it.
+worker_async_engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    future=True,
+    pool_pre_ping=True,
+    pool_size=max(1, settings.INGESTION_DB_MAX_CONNECTIONS // settings.INGESTION_WORKER_CONCURRENCY),
+    max_overflow=0,
+    pool_timeout=60,
+)
+
+WorkerSessionLocal = async_sessionmaker(
+    worker_async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
 # Sync engine for Alembic migrations
 sync_engine = create_engine(
     settings.SYNC_DATABASE_URL,
@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.api.v1 import auth, users, brains, documents, chat
 
@@ -9,6 +10,33 @@ app = FastAPI(
     debug=settings.DEBUG
 )
 
+# Multipart framing and form fields sent along with an uploaded file
+UPLOAD_OVERHEAD_BYTES = 65536
+
+
+# Registered before CORS so its responses still get CORS headers
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse document uploads whose declared size is over the limit.
+    
+    Starlette spools the whole multipart body before the upload handler
+    runs, so this is the only point where an oversized upload can be
+    refused without receiving it.
+    """
+    content_length = request.headers.get("content-length", "")
+    if (
+        request.method == "POST"
+        and request.url.path.endswith("/documents")
+        and content_length.isdigit()
+        and int(content_length) > settings.MAX_UPLOAD_SIZE + UPLOAD_OVERHEAD_BYTES
+    ):
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"File too large. Max size: {settings.MAX_UPLOAD_SIZE} bytes"}
+        )
+    return await call_next(request)
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Text, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Table, Text, JSON, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 import enum
@@ -44,6 +44,15 @@ class BrainVisibility(str, enum.Enum):
     TEAM = "team"
 
 
+class DocumentStatus(str, enum.Enum):
+    PENDING = "pending"
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    RETRYING = "retrying"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class Organization(Base):
     __tablename__ = "organizations"
     
@@ -158,6 +167,9 @@ class Brain(Base):
     owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     is_active = Column(Boolean, default=True)
     settings = Column(JSON, default=dict)  # Store brain-specific settings
+    vector_backend = Column(String(20), nullable=True)  # qdrant or local; NULL means qdrant
+    vector_collection = Column(String(255), nullable=True)  # Qdrant collection holding this brain's vectors
+    vector_shard_key = Column(String(255), nullable=True)  # Qdrant shard key within the collection, if sharded
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -181,12 +193,17 @@ class Document(Base):
     file_type = Column(String(50), nullable=False)  # pdf, docx, txt, image, etc.
     file_path = Column(String(1000), nullable=False)
     file_size = Column(Integer, nullable=False)  # in bytes
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of file contents
     source = Column(String(50), default="upload")  # upload, google_drive
     source_url = Column(String(1000), nullable=True)  # Google Drive URL if applicable
     vector_ids = Column(JSON, default=list)  # Store Qdrant vector IDs
     doc_metadata = Column(JSON, default=dict)
     is_processed = Column(Boolean, default=False)
     processing_error = Column(Text, nullable=True)
+    status = Column(String(20), default=DocumentStatus.PENDING.value, nullable=False, index=True)
+    task_id = Column(String(255), nullable=True)  # Ingestion queue job ID
+    processing_attempts = Column(Integer, default=0)
+    processing_started_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -201,6 +218,8 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     brain_id = Column(Integer, ForeignKey("brains.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(500), nullable=True)
+    summary = Column(Text, nullable=True)  # Rolling summary of compacted older messages
+    summary_message_id = Column(Integer, nullable=True)  # Last message folded into the summary
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -212,6 +231,10 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Serves history tail queries: WHERE session_id = ? ORDER BY created_at DESC LIMIT n
+        Index("ix_chat_messages_session_id_created_at", "session_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, validator
 from typing import Optional, List
 from datetime import datetime
 from app.models.models import BrainVisibility
@@ -264,9 +264,12 @@ class DocumentResponse(DocumentBase):
     original_filename: str
     file_path: str
     file_size: int
+    content_hash: Optional[str] = None
     source_url: Optional[str]
     is_processed: bool
     processing_error: Optional[str]
+    status: str
+    processing_attempts: int = 0
     metadata: dict
     created_at: datetime
     updated_at: datetime
@@ -285,7 +288,7 @@ class ChatMessageResponse(BaseModel):
     role: str
     content: str
     sources: List[dict] = []
-    metadata: dict = {}
+    metadata: dict = Field(default={}, validation_alias=AliasChoices("msg_metadata", "metadata"))
     created_at: datetime
     
     class Config:
@@ -297,6 +300,7 @@ class ChatSessionResponse(BaseModel):
     user_id: int
     brain_id: int
     title: Optional[str]
+    summary: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     messages: List[ChatMessageResponse] = []
@@ -322,13 +326,23 @@ class SearchRequest(BaseModel):
     query: str
     brain_id: int
     limit: int = 10
+    fields: Optional[List[str]] = None  # Payload fields to return; defaults to content and page
+
+
+class FederatedSearchRequest(BaseModel):
+    query: str
+    brain_ids: Optional[List[int]] = None  # None searches every accessible brain
+    limit: int = 10
+    fields: Optional[List[str]] = None  # Payload fields to return; defaults to content and page
 
 
 class SearchResult(BaseModel):
     document: DocumentResponse
-    score: float
-    content: str
+    score: float  # Cosine similarity to the query
+    rank_score: Optional[float] = None  # Fused hybrid ranking score (RRF), when hybrid search is on
+    content: Optional[str] = None
     page: Optional[int] = None
+    payload: Optional[dict] = None  # Requested payload fields, when fields is set
     
     class Config:
         from_attributes = True
@@ -0,0 +1,184 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import redis.asyncio as redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokens containing a digit: error codes, versions, IDs, amounts, dates
+KEY_TERM_PATTERN = re.compile(r"\w*\d\w*")
+
+
+def key_terms(query: str) -> frozenset:
+    """Identifier and number tokens of a query, which embeddings barely tell apart."""
+    return frozenset(KEY_TERM_PATTERN.findall(query.lower()))
+
+
+class BrainVersions:
+    """Per-brain content version counters in Redis.
+    
+    Bumped whenever a brain's documents change, so anything derived from
+    the brain's content (cached answers) can tell it is stale. Shared by
+    the API processes and the ingestion workers.
+    """
+    
+    def __init__(self):
+        self._client = None
+    
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(settings.REDIS_URL)
+        return self._client
+    
+    @staticmethod
+    def _key(brain_id: int) -> str:
+        return f"brain:{brain_id}:version"
+    
+    async def get(self, brain_id: int) -> Optional[int]:
+        """Current version, or None if it cannot be read."""
+        try:
+            value = await self.client.get(self._key(brain_id))
+        except redis.RedisError as e:
+            logger.warning("Brain version read failed: %s", e)
+            return None
+        return int(value) if value is not None else 0
+    
+    async def bump(self, brain_id: int):
+        try:
+            await self.client.incr(self._key(brain_id))
+        except redis.RedisError as e:
+            logger.warning("Brain version bump failed: %s", e)
+
+
+class CachedAnswer(NamedTuple):
+    brain_id: int
+    version: int
+    vector: np.ndarray  # L2-normalised query embedding
+    query: str
+    key_terms: frozenset
+    answer: Dict[str, Any]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """In-process cache of generated answers, matched by query similarity.
+    
+    An entry is reused for a new query on the same brain when the cosine
+    similarity of the query embeddings is at least ``min_similarity``, both
+    queries contain the same identifiers and numbers (see key_terms; "error
+    E1042" and "error E1043" embed almost identically), the brain's version
+    is unchanged and the entry has not expired. Entries
+    are evicted least-recently-used beyond ``max_entries`` in total, and
+    oldest-first beyond ``max_entries_per_brain`` per brain, which also
+    bounds the cost of a lookup (one matrix-vector product over the
+    brain's entries). Each API process has its own cache.
+    """
+    
+    def __init__(self, min_similarity: float, ttl: float, max_entries: int, max_entries_per_brain: int):
+        self.min_similarity = min_similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entries_per_brain = max_entries_per_brain
+        self._entries: "OrderedDict[Tuple[int, int], CachedAnswer]" = OrderedDict()
+        self._brains: Dict[int, List[int]] = {}
+        self._next_id = 0
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evicted": 0}
+    
+    @staticmethod
+    def _normalise(vector: List[float]) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else None
+    
+    def _remove(self, key: Tuple[int, int]):
+        self._entries.pop(key, None)
+        brain_id, entry_id = key
+        entry_ids = self._brains.get(brain_id)
+        if entry_ids is not None:
+            entry_ids.remove(entry_id)
+            if not entry_ids:
+                del self._brains[brain_id]
+    
+    def _prune(self, brain_id: int, version: int):
+        """Drop a brain's expired entries and entries from older versions."""
+        now = time.monotonic()
+        for entry_id in list(self._brains.get(brain_id, [])):
+            entry = self._entries[(brain_id, entry_id)]
+            if entry.version != version:
+                self.stats["stale"] += 1
+            elif entry.expires_at <= now:
+                self.stats["expired"] += 1
+            else:
+                continue
+            self._remove((brain_id, entry_id))
+    
+    def get(self, brain_id: int, query: str, query_vector: List[float], version: int) -> Optional[Dict[str, Any]]:
+        """Return the cached answer for the most similar matching query, if close enough."""
+        self._prune(brain_id, version)
+        entry_ids = self._brains.get(brain_id)
+        terms = key_terms(query)
+        entry_ids = [
+            entry_id for entry_id in entry_ids or []
+            if self._entries[(brain_id, entry_id)].key_terms == terms
+        ]
+        vector = self._normalise(query_vector)
+        if not entry_ids or vector is None:
+            self.stats["misses"] += 1
+            return None
+        
+        matrix = np.stack([self._entries[(brain_id, entry_id)].vector for entry_id in entry_ids])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.min_similarity:
+            self.stats["misses"] += 1
+            return None
+        
+        key = (brain_id, entry_ids[best])
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return self._entries[key].answer
+    
+    def set(self, brain_id: int, query: str, query_vector: List[float], version: int, answer: Dict[str, Any]):
+        vector = self._normalise(query_vector)
+        if vector is None or self.max_entries <= 0:
+            return
+        
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[(brain_id, entry_id)] = CachedAnswer(
+            brain_id, version, vector, query, key_terms(query), answer, time.monotonic() + self.ttl
+        )
+        entry_ids = self._brains.setdefault(brain_id, [])
+        entry_ids.append(entry_id)
+        
+        if len(entry_ids) > self.max_entries_per_brain:
+            self._remove((brain_id, entry_ids[0]))
+            self.stats["evicted"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evicted"] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, hit rate and current size."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "brains": len(self._brains),
+        }
+
+
+# Global instances
+brain_versions = BrainVersions()
+answer_cache = SemanticAnswerCache(
+    min_similarity=settings.ANSWER_CACHE_MIN_SIMILARITY,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_entries_per_brain=settings.ANSWER_CACHE_MAX_ENTRIES_PER_BRAIN
+)
@@ -0,0 +1,29 @@
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import ChatMessage
+
+
+async def load_recent_messages(
+    db: AsyncSession,
+    session_id: int,
+    limit: int,
+    after_id: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """Load the last ``limit`` messages of a session, oldest first.
+    
+    Reads only the tail of the session through the (session_id,
+    created_at) index instead of loading every message. ``after_id``
+    skips messages already folded into the session summary.
+    """
+    query = (
+        select(ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+    )
+    if after_id is not None:
+        query = query.where(ChatMessage.id > after_id)
+    
+    result = await db.execute(query)
+    return [{"role": role, "content": content} for role, content in reversed(result.all())]
@@ -0,0 +1,102 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.services.tokenizer import get_encoding
+
+# A segment is a run of text ending at a sentence terminator (plus any
+# closing quotes/brackets and trailing spaces), a run of newlines, or the
+# end of the text. Segments tile the text exactly, so joining them loses
+# nothing.
+SEGMENT_RE = re.compile(r'[^.!?\n]*(?:[.!?]+[\'")\]]*[ \t]*|\n+|$)')
+
+
+class TokenChunker:
+    """Split text into chunks bounded by a token budget.
+    
+    Chunks break only at sentence or paragraph boundaries unless a single
+    sentence exceeds the budget, in which case it is split by tokens.
+    Consecutive chunks share up to ``overlap_tokens`` tokens of trailing
+    sentences. The text is scanned once; each segment is tokenized once and
+    enters and leaves the sliding window once.
+    """
+    
+    def __init__(self, chunk_tokens: int, overlap_tokens: int = 0, model: str = None):
+        if chunk_tokens <= 0:
+            raise ValueError("chunk_tokens must be positive")
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("overlap_tokens must be between 0 and chunk_tokens")
+        
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = get_encoding(model or settings.EMBEDDING_MODEL)
+    
+    def _segments(self, text: str) -> Iterator[Tuple[str, int]]:
+        """Yield (segment, token_count) pairs, none larger than the budget."""
+        for match in SEGMENT_RE.finditer(text):
+            segment = match.group()
+            if not segment:
+                continue
+            
+            tokens = self.encoding.encode_ordinary(segment)
+            if len(tokens) <= self.chunk_tokens:
+                yield segment, len(tokens)
+                continue
+            
+            # Oversized sentence: fall back to fixed token windows
+            for start in range(0, len(tokens), self.chunk_tokens):
+                window = tokens[start:start + self.chunk_tokens]
+                yield self.encoding.decode(window), len(window)
+    
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """Yield chunks of text in order."""
+        window = deque()
+        window_tokens = 0
+        has_new = False
+        
+        for segment, tokens in self._segments(text):
+            if window_tokens + tokens > self.chunk_tokens:
+                if has_new:
+                    chunk = "".join(s for s, _ in window).strip()
+                    if chunk:
+                        yield chunk
+                    has_new = False
+                
+                # Keep a tail of whole segments as overlap for the next chunk
+                while window and (
+                    window_tokens > self.overlap_tokens
+                    or window_tokens + tokens > self.chunk_tokens
+                ):
+                    _, dropped = window.popleft()
+                    window_tokens -= dropped
+            
+            window.append((segment, tokens))
+            window_tokens += tokens
+            has_new = True
+        
+        if has_new:
+            chunk = "".join(s for s, _ in window).strip()
+            if chunk:
+                yield chunk
+    
+    def chunk(self, text: str) -> List[str]:
+        """Split text into a list of chunks."""
+        return list(self.iter_chunks(text))
+
+
+@lru_cache(maxsize=32)
+def get_chunker(chunk_tokens: int, overlap_tokens: int) -> TokenChunker:
+    return TokenChunker(chunk_tokens, overlap_tokens)
+
+
+def chunker_for_brain(brain_settings: Optional[Dict[str, Any]] = None) -> TokenChunker:
+    """Return a chunker using a brain's chunk settings, falling back to defaults.
+    
+    Recognised ``Brain.settings`` keys are ``chunk_tokens`` and
+    ``chunk_overlap_tokens``.
+    """
+    brain_settings = brain_settings or {}
+    chunk_tokens = int(brain_settings.get("chunk_tokens") or settings.CHUNK_TOKENS)
+    overlap_tokens = int(brain_settings.get("chunk_overlap_tokens", settings.CHUNK_OVERLAP_TOKENS))
+    return get_chunker(chunk_tokens, min(overlap_tokens, chunk_tokens - 1))
@@ -0,0 +1,198 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.services.tokenizer import get_encoding
+
+# Chat format overhead per message, plus the tokens priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+# Truncated chunks shorter than this are dropped instead
+MIN_CHUNK_TOKENS = 32
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+class PackedPrompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    results: List[Dict[str, Any]]  # Search results whose content made it into the prompt
+    tokens: Dict[str, int]
+
+
+def overlap_size(first: str, second: str) -> int:
+    """Length of the longest suffix of ``first`` that is a prefix of ``second``."""
+    for size in range(min(len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def dedupe_chunks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop repeated chunks and trim the overlap between neighbouring ones.
+    
+    Identical chunks (same content hash, or same text) are kept once.
+    Consecutive chunks of a document share CHUNK_OVERLAP_TOKENS of text;
+    when both are retrieved, the lower-ranked one loses the repeated part.
+    Results keep their rank order; trimmed ones get a new ``content``.
+    """
+    seen = set()
+    by_position = {}
+    deduped = []
+    
+    for result in results:
+        payload = result["payload"]
+        content = payload.get("content", "")
+        key = payload.get("chunk_hash") or content
+        if key in seen:
+            continue
+        seen.add(key)
+        
+        document_id = payload.get("document_id")
+        chunk_index = payload.get("chunk_index")
+        if chunk_index is not None:
+            original = content
+            before = by_position.get((document_id, chunk_index - 1))
+            if before is not None:
+                content = content[overlap_size(before, content):]
+            after = by_position.get((document_id, chunk_index + 1))
+            if after is not None:
+                content = content[:len(content) - overlap_size(content, after)]
+            by_position[(document_id, chunk_index)] = original
+            content = content.strip()
+            if not content:
+                continue
+        
+        deduped.append({**result, "payload": {**payload, "content": content}})
+    
+    return deduped
+
+
+class ContextPacker:
+    """Fit system prompt, history and retrieved chunks into a token budget.
+    
+    The system prompt and the question are always sent. The most recent
+    history turns come next, up to ``history_budget`` tokens, then
+    retrieved chunks in rank order fill what is left; the last chunk that
+    does not fit is truncated rather than dropped when enough room
+    remains.
+    """
+    
+    def __init__(self, model: str, budget: int, history_budget: int):
+        self.model = model
+        self.budget = budget
+        self.history_budget = history_budget
+    
+    @property
+    def encoding(self):
+        return get_encoding(self.model)
+    
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode_ordinary(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+    
+    def pack(
+        self,
+        system_prompt: str,
+        query: str,
+        results: List[Dict[str, Any]],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        summary: Optional[str] = None
+    ) -> PackedPrompt:
+        """Build the chat messages for a query within the budget.
+        
+        A conversation ``summary`` is sent as a second system message and
+        takes its share of the history budget before the recent turns.
+        """
+        system_tokens = self.count(system_prompt) + TOKENS_PER_MESSAGE
+        question_prefix = "Context:\n"
+        question_suffix = f"\n\nQuestion: {query}"
+        question_tokens = self.count(question_prefix + question_suffix) + TOKENS_PER_MESSAGE
+        remaining = self.budget - system_tokens - question_tokens - TOKENS_REPLY_PRIMING
+        
+        history_limit = min(self.history_budget, max(remaining, 0))
+        
+        # Summary of older turns first, then the most recent turns
+        summary_message = None
+        summary_tokens = 0
+        if summary:
+            content = SUMMARY_PREFIX + summary
+            room = history_limit - TOKENS_PER_MESSAGE
+            if room >= MIN_CHUNK_TOKENS:
+                content = self.truncate(content, room)
+                summary_message = {"role": "system", "content": content}
+                summary_tokens = self.count(content) + TOKENS_PER_MESSAGE
+        history_limit -= summary_tokens
+        remaining -= summary_tokens
+        
+        history = []
+        history_tokens = 0
+        for message in reversed(chat_history or []):
+            cost = self.count(message["content"]) + TOKENS_PER_MESSAGE
+            if history_tokens + cost > history_limit:
+                break
+            history.append(message)
+            history_tokens += cost
+        history.reverse()
+        remaining -= history_tokens
+        
+        # Retrieved chunks in rank order, truncating the one that overflows
+        kept = []
+        parts = []
+        context_tokens = 0
+        separator_tokens = self.count("\n\n")
+        for result in dedupe_chunks(results):
+            content = result["payload"]["content"]
+            cost = self.count(content) + (separator_tokens if parts else 0)
+            if context_tokens + cost > remaining:
+                room = remaining - context_tokens - (separator_tokens if parts else 0)
+                if room >= MIN_CHUNK_TOKENS:
+                    content = self.truncate(content, room)
+                    parts.append(content)
+                    kept.append(result)
+                    context_tokens += self.count(content) + (separator_tokens if len(parts) > 1 else 0)
+                break
+            parts.append(content)
+            kept.append(result)
+            context_tokens += cost
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_message is not None:
+            messages.append(summary_message)
+        messages.extend(history)
+        messages.append({
+            "role": "user",
+            "content": question_prefix + "\n\n".join(parts) + question_suffix
+        })
+        
+        return PackedPrompt(
+            messages=messages,
+            results=kept,
+            tokens={
+                "prompt_tokens": (
+                    system_tokens + summary_tokens + history_tokens + context_tokens
+                    + question_tokens + TOKENS_REPLY_PRIMING
+                ),
+                "system_tokens": system_tokens,
+                "summary_tokens": summary_tokens,
+                "history_tokens": history_tokens,
+                "context_tokens": context_tokens,
+                "question_tokens": question_tokens,
+                "history_messages": len(history),
+                "history_messages_dropped": len(chat_history or []) - len(history),
+                "chunks_used": len(kept),
+                "chunks_retrieved": len(results),
+                "budget": self.budget
+            }
+        )
+
+
+# Global instance
+context_packer = ContextPacker(
+    model=settings.LLM_MODEL,
+    budget=settings.LLM_CONTEXT_BUDGET,
+    history_budget=settings.LLM_HISTORY_BUDGET
+)
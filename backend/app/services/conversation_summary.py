@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, List, Set
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import ChatSession, ChatMessage
+from app.services.context_packer import context_packer, TOKENS_PER_MESSAGE
+from app.services.llm_service import llm_service
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummarizer:
+    """Compacts older chat messages into each session's rolling summary.
+    
+    Messages after ``ChatSession.summary_message_id`` are the session's
+    live history. Once that history grows past ``trigger_tokens``, all but
+    the most recent ``keep_tokens`` of it are folded into the summary, so
+    each compaction only summarizes messages not seen before.
+    """
+    
+    def __init__(self, trigger_tokens: int, keep_tokens: int):
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self._running: Set[int] = set()
+    
+    def history_tokens(self, history: List[Dict[str, str]]) -> int:
+        return sum(context_packer.count(message["content"]) + TOKENS_PER_MESSAGE for message in history)
+    
+    def should_compact(self, history: List[Dict[str, str]]) -> bool:
+        return self.history_tokens(history) > self.trigger_tokens
+    
+    async def compact(self, session_id: int):
+        """Fold a session's older live messages into its summary.
+        
+        Meant to run as a background task. A compaction already running for
+        the session in this process is not duplicated, and the summary is
+        only written if no other process moved it on meanwhile.
+        """
+        if session_id in self._running:
+            return
+        self._running.add(session_id)
+        
+        try:
+            async with AsyncSessionLocal() as db:
+                session = await db.get(ChatSession, session_id)
+                if session is None:
+                    return
+                
+                query = select(ChatMessage).where(ChatMessage.session_id == session_id)
+                if session.summary_message_id is not None:
+                    query = query.where(ChatMessage.id > session.summary_message_id)
+                result = await db.execute(query.order_by(ChatMessage.created_at, ChatMessage.id))
+                messages = result.scalars().all()
+                
+                # Keep the most recent messages verbatim
+                kept_tokens = 0
+                split = len(messages)
+                while split > 0:
+                    cost = context_packer.count(messages[split - 1].content) + TOKENS_PER_MESSAGE
+                    if kept_tokens + cost > self.keep_tokens:
+                        break
+                    kept_tokens += cost
+                    split -= 1
+                older = messages[:split]
+                if not older:
+                    return
+                
+                summary = await llm_service.summarize_conversation(
+                    session.summary,
+                    [{"role": message.role, "content": message.content} for message in older]
+                )
+                
+                await db.execute(
+                    update(ChatSession)
+                    .where(
+                        ChatSession.id == session_id,
+                        ChatSession.summary_message_id.is_not_distinct_from(session.summary_message_id)
+                    )
+                    .values(
+                        summary=summary,
+                        summary_message_id=older[-1].id,
+                        # Compaction is not session activity
+                        updated_at=ChatSession.updated_at
+                    )
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Compacting chat session %s failed", session_id)
+        finally:
+            self._running.discard(session_id)
+
+
+# Global instance
+conversation_summarizer = ConversationSummarizer(
+    trigger_tokens=settings.CHAT_SUMMARY_TRIGGER_TOKENS,
+    keep_tokens=settings.CHAT_SUMMARY_KEEP_TOKENS
+)
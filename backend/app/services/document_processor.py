@@ -1,190 +1,296 @@
 import os
+import asyncio
+import hashlib
 import aiofiles
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from pypdf import PdfReader
-from docx import Document as DocxDocument
-from PIL import Image
-import pytesseract
-from io import BytesIO
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable, Awaitable
+from fastapi import UploadFile
 from app.core.config import settings
+from app.services import extraction
+from app.services.chunker import chunker_for_brain
+from app.services.extraction import extraction_pool
 from app.services.embeddings import embedding_service
 from app.services.vector_store import vector_store
+from app.services.vector_backend import point_id_for
+from app.services.lexical_index import lexical_index
 import uuid
 
 
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+def hash_text(text: str) -> str:
+    """Content hash used to match chunks across document versions."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 class DocumentProcessor:
     def __init__(self):
         self.upload_dir = settings.UPLOAD_DIR
     
-    async def save_file(self, file_content: bytes, filename: str, brain_id: int) -> str:
-        """Save uploaded file to disk."""
+    async def save_upload(
+        self,
+        file: UploadFile,
+        brain_id: int,
+        max_size: int = None
+    ) -> Tuple[str, int, str]:
+        """Copy an upload to disk in fixed-size chunks.
+        
+        By the time this runs Starlette has already spooled the request body
+        (in memory, then in a temporary file), so the size limit bounds what
+        is copied and stored, not what is received; requests declaring an
+        oversized Content-Length are refused earlier by
+        app.main.reject_oversized_uploads. The sha256 is computed while
+        copying, into a temporary file that is atomically moved into place
+        once complete.
+        
+        Returns (file_path, file_size, sha256 hex digest).
+        """
+        max_size = max_size or settings.MAX_UPLOAD_SIZE
         brain_dir = self.upload_dir / str(brain_id)
         brain_dir.mkdir(parents=True, exist_ok=True)
         
-        # Generate unique filename
-        file_extension = Path(filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = brain_dir / unique_filename
+        file_extension = Path(file.filename).suffix
+        unique_name = str(uuid.uuid4())
+        file_path = brain_dir / f"{unique_name}{file_extension}"
+        temp_path = brain_dir / f".{unique_name}.part"
         
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
+        digest = hashlib.sha256()
+        size = 0
         
-        return str(file_path)
-    
-    def extract_text_from_pdf(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text from PDF file."""
-        chunks = []
         try:
-            reader = PdfReader(file_path)
-            for page_num, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if text.strip():
-                    chunks.append({
-                        "content": text,
-                        "page": page_num + 1,
-                        "type": "pdf"
-                    })
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
-        
-        return chunks
-    
-    def extract_text_from_docx(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text from DOCX file."""
-        chunks = []
-        try:
-            doc = DocxDocument(file_path)
-            full_text = []
-            
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    full_text.append(para.text)
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLargeError(f"File too large. Max size: {max_size} bytes")
+                    digest.update(chunk)
+                    await f.write(chunk)
             
-            # Combine paragraphs and split into chunks
-            text = "\n".join(full_text)
-            if text.strip():
-                chunks.append({
-                    "content": text,
-                    "type": "docx"
-                })
-        except Exception as e:
-            raise Exception(f"Error extracting text from DOCX: {str(e)}")
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
         
-        return chunks
+        return str(file_path), size, digest.hexdigest()
     
-    def extract_text_from_txt(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text from TXT file."""
-        chunks = []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-                if text.strip():
-                    chunks.append({
-                        "content": text,
-                        "type": "txt"
-                    })
-        except Exception as e:
-            raise Exception(f"Error extracting text from TXT: {str(e)}")
+    async def _iter_in_order(self, calls: List[Tuple]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Run extraction calls in the pool with bounded lookahead, yielding in order."""
+        lookahead = max(1, settings.EXTRACTION_WORKERS)
+        calls = iter(calls)
+        pending = deque()
+        
+        def schedule():
+            call = next(calls, None)
+            if call is not None:
+                pending.append(asyncio.ensure_future(extraction_pool.run(*call)))
+        
+        for _ in range(lookahead):
+            schedule()
         
-        return chunks
-    
-    def extract_text_from_image(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract text from image using OCR."""
-        chunks = []
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            if text.strip():
-                chunks.append({
-                    "content": text,
-                    "type": "image"
-                })
-        except Exception as e:
-            raise Exception(f"Error extracting text from image: {str(e)}")
+            while pending:
+                part = await pending.popleft()
+                schedule()
+                yield part
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _iter_txt_blocks(self, file_path: str) -> AsyncIterator[Dict[str, Any]]:
+        """Read a text file in blocks, splitting at the last line break of each block."""
+        remainder = ""
+        async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = await f.read(settings.EXTRACTION_TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                
+                text = remainder + block
+                cut = text.rfind('\n')
+                if cut <= 0:
+                    remainder = text
+                    continue
+                
+                remainder = text[cut + 1:]
+                if text[:cut].strip():
+                    yield {"content": text[:cut], "type": "txt"}
         
-        return chunks
+        if remainder.strip():
+            yield {"content": remainder, "type": "txt"}
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks."""
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
+    async def iter_text(self, file_path: str, file_type: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream extracted text sections in document order.
+        
+        PDFs are extracted in page ranges and images per frame in the
+        extraction process pool, with a bounded number of ranges in flight so
+        memory does not grow with document size.
+        """
+        labels = {"pdf": "PDF", "docx": "DOCX", "doc": "DOCX", "txt": "TXT", "png": "image", "jpg": "image", "jpeg": "image"}
+        if file_type not in labels:
+            raise Exception(f"Unsupported file type: {file_type}")
+        
+        try:
+            if file_type == "txt":
+                async for section in self._iter_txt_blocks(file_path):
+                    yield section
+                return
             
-            # Try to break at sentence or word boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                last_space = chunk.rfind(' ')
-                
-                break_point = max(last_period, last_newline, last_space)
-                if break_point > 0:
-                    chunk = chunk[:break_point + 1]
-                    end = start + len(chunk)
+            if file_type == "pdf":
+                page_count = await extraction_pool.run(extraction.pdf_page_count, file_path)
+                step = settings.EXTRACTION_PDF_PAGES_PER_TASK
+                calls = [
+                    (extraction.extract_pdf_pages, file_path, start, start + step)
+                    for start in range(0, page_count, step)
+                ]
+            elif file_type in ["docx", "doc"]:
+                calls = [(extraction.extract_docx, file_path)]
+            else:
+                frames = await extraction_pool.run(extraction.image_frame_count, file_path)
+                calls = [
+                    (extraction.extract_image_frame, file_path, frame, frames > 1)
+                    for frame in range(frames)
+                ]
             
-            chunks.append(chunk.strip())
-            start = end - overlap
-        
-        return chunks
+            async for part in self._iter_in_order(calls):
+                for section in part:
+                    yield section
+        except Exception as e:
+            raise Exception(f"Error extracting text from {labels[file_type]}: {str(e)}")
     
-    async def process_document(
+    async def iter_chunks(
         self,
         file_path: str,
         file_type: str,
         brain_id: int,
         document_id: int,
-        metadata: Dict[str, Any] = None
-    ) -> List[str]:
-        """Process document and store in vector database."""
-        # Extract text based on file type
-        if file_type == "pdf":
-            text_chunks = self.extract_text_from_pdf(file_path)
-        elif file_type in ["docx", "doc"]:
-            text_chunks = self.extract_text_from_docx(file_path)
-        elif file_type == "txt":
-            text_chunks = self.extract_text_from_txt(file_path)
-        elif file_type in ["png", "jpg", "jpeg"]:
-            text_chunks = self.extract_text_from_image(file_path)
-        else:
-            raise Exception(f"Unsupported file type: {file_type}")
+        metadata: Dict[str, Any] = None,
+        brain_settings: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Stream (text, payload) pairs for each chunk of a document."""
+        chunker = chunker_for_brain(brain_settings)
+        chunk_index = 0
         
-        # Process each chunk
-        all_vectors = []
-        all_payloads = []
-        
-        for chunk_data in text_chunks:
-            content = chunk_data["content"]
-            
-            # Further split large chunks
-            sub_chunks = self.chunk_text(content)
-            
-            for sub_chunk in sub_chunks:
-                # Create embedding
-                embedding = await embedding_service.create_embedding(sub_chunk)
-                
-                # Prepare payload
+        async for chunk_data in self.iter_text(file_path, file_type):
+            # Further split large sections
+            for sub_chunk in chunker.iter_chunks(chunk_data["content"]):
                 payload = {
                     "content": sub_chunk,
                     "document_id": document_id,
                     "brain_id": brain_id,
                     "file_type": file_type,
+                    "chunk_index": chunk_index,
+                    "chunk_hash": hash_text(sub_chunk),
                     **(metadata or {}),
                     **{k: v for k, v in chunk_data.items() if k != "content"}
                 }
-                
-                all_vectors.append(embedding)
-                all_payloads.append(payload)
-        
-        # Store in vector database
-        vector_ids = vector_store.add_vectors(
-            vectors=all_vectors,
-            payloads=all_payloads,
-            brain_id=brain_id,
-            document_id=document_id
-        )
+                chunk_index += 1
+                yield sub_chunk, payload
+    
+    async def process_document(
+        self,
+        file_path: str,
+        file_type: str,
+        brain_id: int,
+        document_id: int,
+        metadata: Dict[str, Any] = None,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+        brain_settings: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Process document and store in vector database.
+        
+        Extraction, chunking, embedding and upserts are streamed: chunks are
+        flushed to the vector store every INGESTION_FLUSH_BATCH_SIZE chunks,
+        so memory stays bounded and stored batches survive a later failure.
+        ``on_progress`` is awaited with the number of chunks stored so far.
+        Chunk sizes come from ``brain_settings`` (see chunker_for_brain).
+        
+        Re-processing a document is incremental: chunks whose content hash
+        is already stored for the document keep their vectors (their
+        payloads are rewritten with the new position and metadata), only
+        new chunks are embedded, and vectors for chunks that no longer
+        appear are deleted at the end.
+        
+        New chunks get deterministic point IDs (see point_id_for), so a
+        retried run overwrites rather than duplicates. Upserts are not
+        waited on individually; the vector store is synced before returning,
+        so every returned point is searchable.
+        """
+        existing = await vector_store.get_chunk_hashes(brain_id, document_id)
+        vector_ids = []
+        claimed = set()
+        texts = []
+        payloads = []
+        
+        def new_point_id(payload: Dict[str, Any]) -> str:
+            point_id = point_id_for(document_id, payload["chunk_index"], payload["chunk_hash"])
+            # A repeated chunk may already have reused this ID from its old position
+            if point_id in claimed:
+                point_id = point_id_for(document_id, payload["chunk_index"], f"{payload['chunk_hash']}:{len(vector_ids)}")
+            return point_id
+        
+        async def flush():
+            new_texts = []
+            new_payloads = []
+            new_ids = []
+            kept_payloads = []
+            kept_ids = []
+            for text, payload in zip(texts, payloads):
+                kept = existing.get(payload["chunk_hash"])
+                if kept:
+                    vector_ids.append(kept.pop())
+                    kept_payloads.append(payload)
+                    kept_ids.append(vector_ids[-1])
+                else:
+                    new_texts.append(text)
+                    new_payloads.append(payload)
+                    vector_ids.append(new_point_id(payload))
+                    new_ids.append(vector_ids[-1])
+                claimed.add(vector_ids[-1])
+            
+            if new_texts:
+                vectors = await embedding_service.create_embeddings_batched(new_texts)
+                await vector_store.add_vectors(
+                    vectors=vectors,
+                    payloads=new_payloads,
+                    brain_id=brain_id,
+                    document_id=document_id,
+                    point_ids=new_ids
+                )
+            
+            # Reused points get this version's chunk_index, page and metadata
+            await vector_store.set_payloads(brain_id, kept_ids, kept_payloads)
+            await lexical_index.add(brain_id, new_ids + kept_ids, new_payloads + kept_payloads)
+            
+            texts.clear()
+            payloads.clear()
+            if on_progress is not None:
+                await on_progress(len(vector_ids))
+        
+        async for text, payload in self.iter_chunks(
+            file_path, file_type, brain_id, document_id, metadata, brain_settings
+        ):
+            texts.append(text)
+            payloads.append(payload)
+            if len(texts) >= settings.INGESTION_FLUSH_BATCH_SIZE:
+                await flush()
+        
+        if texts:
+            await flush()
+        
+        # Remove vectors for chunks that disappeared from this version
+        stale_ids = [point_id for point_ids in existing.values() for point_id in point_ids]
+        await vector_store.delete_points(brain_id, stale_ids)
+        await lexical_index.delete_points(brain_id, stale_ids)
+        
+        # Consistency barrier before the caller marks the document processed
+        await vector_store.sync(brain_id)
         
         return vector_ids
     
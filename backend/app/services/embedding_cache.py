@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import redis.asyncio as redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    """Encode a vector as compact float32 bytes."""
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    """Decode float32 bytes back into a vector."""
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class LRUBytesCache:
+    """In-process LRU cache of packed vectors bounded by total byte size."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+        
+        self._data[key] = value
+        self.current_bytes += len(value)
+        
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.current_bytes -= len(evicted)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (model, sha256(text)).
+    
+    Lookups go to the in-process LRU first, then to Redis. Redis hits are
+    promoted into the LRU. Redis failures are logged and treated as misses.
+    """
+    
+    def __init__(self):
+        self.local = LRUBytesCache(settings.EMBEDDING_CACHE_MAX_BYTES)
+        self.ttl = settings.EMBEDDING_CACHE_TTL_SECONDS
+        self.redis = None
+        if settings.EMBEDDING_CACHE_REDIS_ENABLED:
+            self.redis = redis.from_url(settings.REDIS_URL)
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{model}:{digest}"
+    
+    async def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Return cached embeddings keyed by the index of the text."""
+        found = {}
+        remote_indexes = []
+        keys = [self.make_key(model, text) for text in texts]
+        
+        for index, key in enumerate(keys):
+            value = self.local.get(key)
+            if value is not None:
+                found[index] = unpack_vector(value)
+                self.stats["local_hits"] += 1
+            else:
+                remote_indexes.append(index)
+        
+        if remote_indexes and self.redis is not None:
+            try:
+                values = await self.redis.mget([keys[i] for i in remote_indexes])
+            except redis.RedisError as e:
+                logger.warning("Embedding cache read failed: %s", e)
+                values = [None] * len(remote_indexes)
+            
+            for index, value in zip(remote_indexes, values):
+                if value is not None:
+                    self.local.set(keys[index], value)
+                    found[index] = unpack_vector(value)
+                    self.stats["redis_hits"] += 1
+        
+        self.stats["misses"] += len(texts) - len(found)
+        return found
+    
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings in both cache tiers."""
+        packed = {
+            self.make_key(model, text): pack_vector(embedding)
+            for text, embedding in zip(texts, embeddings)
+        }
+        
+        for key, value in packed.items():
+            self.local.set(key, value)
+        
+        if self.redis is not None and packed:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in packed.items():
+                        pipe.set(key, value, ex=self.ttl)
+                    await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning("Embedding cache write failed: %s", e)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and local tier usage."""
+        return {
+            **self.stats,
+            "local_items": len(self.local),
+            "local_bytes": self.local.current_bytes,
+        }
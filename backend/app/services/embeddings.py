@@ -1,15 +1,94 @@
+import asyncio
 from openai import AsyncOpenAI
-from typing import List
+from typing import List, Optional, Set, Tuple
 from app.core.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.tokenizer import count_tokens
+
+
+class EmbeddingMicroBatcher:
+    """Collect concurrent single-text embedding requests into one API call.
+    
+    Texts are queued for up to ``max_wait_ms`` or until ``max_batch_size``
+    texts are pending, then embedded together and the results are fanned
+    back out to the waiting callers.
+    """
+    
+    def __init__(self, service: "EmbeddingService", max_wait_ms: float, max_batch_size: int):
+        self.service = service
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The event loop only holds weak references to running tasks
+        self._batches: Set[asyncio.Task] = set()
+    
+    async def submit(self, text: str) -> List[float]:
+        """Queue a text and wait for its embedding."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Send all pending texts as a single batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        pending, self._pending = self._pending, []
+        if pending:
+            batch = asyncio.ensure_future(self._run_batch(pending))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+    
+    async def _run_batch(self, pending: List[Tuple[str, asyncio.Future]]):
+        """Embed a batch and resolve the waiting futures."""
+        # Identical texts in the same window share one input
+        unique_texts = list(dict.fromkeys(text for text, _ in pending))
+        
+        try:
+            embeddings = await self.service.create_embeddings(unique_texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        by_text = dict(zip(unique_texts, embeddings))
+        for text, future in pending:
+            if not future.done():
+                future.set_result(by_text[text])
 
 
 class EmbeddingService:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.EMBEDDING_MODEL
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.batch_max_tokens = settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.batch_concurrency = settings.EMBEDDING_BATCH_CONCURRENCY
+        self.cache = EmbeddingCache() if settings.EMBEDDING_CACHE_ENABLED else None
+        self.batcher = None
+        if settings.EMBEDDING_MICROBATCH_WAIT_MS > 0:
+            self.batcher = EmbeddingMicroBatcher(
+                self,
+                max_wait_ms=settings.EMBEDDING_MICROBATCH_WAIT_MS,
+                max_batch_size=settings.EMBEDDING_MICROBATCH_MAX_SIZE
+            )
     
-    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings for a list of texts."""
+    def count_tokens(self, text: str) -> int:
+        """Count tokens in text for the embedding model."""
+        return count_tokens(text, self.model)
+    
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API for a list of texts."""
         response = await self.client.embeddings.create(
             input=texts,
             model=self.model
@@ -18,10 +97,76 @@ class EmbeddingService:
         embeddings = [item.embedding for item in response.data]
         return embeddings
     
+    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for a list of texts, serving repeats from cache."""
+        if self.cache is None:
+            return await self._request_embeddings(texts)
+        
+        cached = await self.cache.get_many(self.model, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = await self._request_embeddings(missing_texts)
+            await self.cache.set_many(self.model, missing_texts, new_embeddings)
+            cached.update(zip(missing, new_embeddings))
+        
+        return [cached[i] for i in range(len(texts))]
+    
     async def create_embedding(self, text: str) -> List[float]:
-        """Create embedding for a single text."""
+        """Create embedding for a single text.
+        
+        Concurrent calls are coalesced by the micro-batcher when enabled.
+        """
+        if self.batcher is not None:
+            return await self.batcher.submit(text)
+        
         embeddings = await self.create_embeddings([text])
         return embeddings[0]
+    
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indexes into batches bounded by item count and tokens."""
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for index, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (
+                len(current) >= self.batch_size
+                or current_tokens + tokens > self.batch_max_tokens
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        
+        return batches
+    
+    async def create_embeddings_batched(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for many texts using bounded concurrent batches.
+        
+        Results are returned in the same order as the input texts.
+        """
+        if not texts:
+            return []
+        
+        embeddings: List[List[float]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        async def run_batch(indexes: List[int]):
+            async with semaphore:
+                batch_embeddings = await self.create_embeddings([texts[i] for i in indexes])
+            for i, embedding in zip(indexes, batch_embeddings):
+                embeddings[i] = embedding
+        
+        await asyncio.gather(*(run_batch(batch) for batch in self.make_batches(texts)))
+        
+        return embeddings
 
 
 # Global instance
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+from pypdf import PdfReader
+from docx import Document as DocxDocument
+from PIL import Image
+import pytesseract
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Extraction functions run inside pool worker processes, so they must be
+# importable module-level functions that take and return picklable values.
+
+def pdf_page_count(file_path: str) -> int:
+    """Return the number of pages in a PDF."""
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Extract text from PDF pages in [start, end)."""
+    chunks = []
+    reader = PdfReader(file_path)
+    for page_num in range(start, min(end, len(reader.pages))):
+        text = reader.pages[page_num].extract_text()
+        if text.strip():
+            chunks.append({
+                "content": text,
+                "page": page_num + 1,
+                "type": "pdf"
+            })
+    return chunks
+
+
+def extract_docx(file_path: str) -> List[Dict[str, Any]]:
+    """Extract paragraph text from a DOCX file."""
+    doc = DocxDocument(file_path)
+    text = "\n".join(para.text for para in doc.paragraphs if para.text.strip())
+    if not text.strip():
+        return []
+    return [{"content": text, "type": "docx"}]
+
+
+def image_frame_count(file_path: str) -> int:
+    """Return the number of frames (pages) in an image."""
+    with Image.open(file_path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def extract_image_frame(file_path: str, frame: int, multi_frame: bool) -> List[Dict[str, Any]]:
+    """OCR a single image frame."""
+    with Image.open(file_path) as image:
+        image.seek(frame)
+        text = pytesseract.image_to_string(image)
+    if not text.strip():
+        return []
+    chunk = {"content": text, "type": "image"}
+    if multi_frame:
+        chunk["page"] = frame + 1
+    return [chunk]
+
+
+class ExtractionPool:
+    """Process pool for CPU-bound text extraction.
+    
+    Worker processes are recycled after EXTRACTION_MAX_TASKS_PER_CHILD tasks
+    to contain memory growth in pypdf/Pillow. Celery pool children are
+    allowed to start it (see app.worker.tasks.allow_extraction_processes).
+    When the pool is disabled, or the pool is first needed in a daemonic
+    process (which may not start children), extraction runs in a thread
+    instead so the event loop still stays responsive.
+    """
+    
+    def __init__(self, max_workers: int, max_tasks_per_child: int):
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._use_threads = max_workers <= 0
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._use_threads:
+            return None
+        if self._executor is None:
+            if multiprocessing.current_process().daemon:
+                logger.warning("Extraction runs in a daemonic process; using threads")
+                self._use_threads = True
+                return None
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                max_tasks_per_child=self.max_tasks_per_child
+            )
+        return self._executor
+    
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run an extraction function off the event loop."""
+        executor = self._get_executor()
+        if executor is None:
+            return await asyncio.to_thread(fn, *args)
+        
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a malformed file); start a fresh pool
+            self.shutdown()
+            raise
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+extraction_pool = ExtractionPool(
+    max_workers=settings.EXTRACTION_WORKERS,
+    max_tasks_per_child=settings.EXTRACTION_MAX_TASKS_PER_CHILD
+)
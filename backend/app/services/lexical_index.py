@@ -0,0 +1,176 @@
+import asyncio
+import json
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List
+from app.core.config import settings
+
+# Hyphens and underscores are token characters so identifiers such as
+# SKU-88317, E1042 or ERR_TIMEOUT are indexed and matched whole.
+TOKENIZER = "unicode61 tokenchars '-_'"
+QUERY_TOKEN_RE = re.compile(r"[\w\-]+")
+
+# Common English words left out of lexical queries; matching them alone
+# says nothing about relevance
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he
+her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their theirs them
+then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours
+""".split())
+
+# Payload fields kept with each lexical entry so lexical-only hits can be
+# returned without a vector store round trip
+STORED_FIELDS = ["content", "document_id", "brain_id", "page", "file_type", "filename", "chunk_index", "chunk_hash"]
+
+
+# Bound on SQL variables per statement (SQLite's default limit is 999)
+MAX_SQL_VARIABLES = 500
+
+SCHEMA = [
+    # Point metadata, indexed for deletes; rowid is shared with entries_fts
+    "CREATE TABLE IF NOT EXISTS entries ("
+    "rowid INTEGER PRIMARY KEY, point_id TEXT NOT NULL UNIQUE, document_id INTEGER, payload TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_entries_document_id ON entries (document_id)",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(content, tokenize=\"{TOKENIZER}\")",
+]
+
+
+def _batches(values: List[Any]) -> List[List[Any]]:
+    return [values[i:i + MAX_SQL_VARIABLES] for i in range(0, len(values), MAX_SQL_VARIABLES)]
+
+
+class LexicalIndex:
+    """Per-brain BM25 index backed by SQLite FTS5.
+    
+    Each brain has its own database file under LEXICAL_INDEX_DIR, keyed by
+    the same point IDs as the vector store. Chunk text lives in an FTS5
+    table; point IDs, document IDs and payloads live in an ordinary table
+    indexed for deletes, sharing the FTS rowid. SQLite handles locking, so
+    the ingestion workers that write and the API processes that read can
+    share the files. Chunks stored before this index existed are added by
+    scripts/backfill_lexical_index.py.
+    """
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+    
+    def _path(self, brain_id: int) -> Path:
+        return self.root / f"{brain_id}.sqlite3"
+    
+    def _connect(self, brain_id: int, create: bool = False) -> sqlite3.Connection:
+        path = self._path(brain_id)
+        if create:
+            self.root.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        if create:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._migrate_legacy(conn)
+        return conn
+    
+    @staticmethod
+    def _migrate_legacy(conn: sqlite3.Connection):
+        """Move entries from the original single FTS table, whose columns were all unindexed."""
+        legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks'").fetchone()
+        if legacy is None:
+            return
+        rows = conn.execute("SELECT point_id, document_id, payload, content FROM chunks").fetchall()
+        for point_id, document_id, payload, content in rows:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO entries (point_id, document_id, payload) VALUES (?, ?, ?)",
+                (point_id, document_id, payload)
+            )
+            if cursor.rowcount:
+                conn.execute("INSERT INTO entries_fts (rowid, content) VALUES (?, ?)", (cursor.lastrowid, content))
+        conn.execute("DROP TABLE chunks")
+    
+    @staticmethod
+    def _delete_rows(conn: sqlite3.Connection, column: str, values: List[Any]):
+        """Delete entries whose ``column`` (point_id or document_id) is in values."""
+        for batch in _batches(values):
+            marks = ", ".join("?" * len(batch))
+            rowids = [row[0] for row in conn.execute(f"SELECT rowid FROM entries WHERE {column} IN ({marks})", batch)]
+            for rowid_batch in _batches(rowids):
+                rowid_marks = ", ".join("?" * len(rowid_batch))
+                conn.execute(f"DELETE FROM entries_fts WHERE rowid IN ({rowid_marks})", rowid_batch)
+                conn.execute(f"DELETE FROM entries WHERE rowid IN ({rowid_marks})", rowid_batch)
+    
+    def _add(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        with closing(self._connect(brain_id, create=True)) as conn, conn:
+            # Delete first so a retried flush replaces rather than duplicates
+            self._delete_rows(conn, "point_id", list(point_ids))
+            for point_id, payload in zip(point_ids, payloads):
+                cursor = conn.execute(
+                    "INSERT INTO entries (point_id, document_id, payload) VALUES (?, ?, ?)",
+                    (
+                        point_id,
+                        payload.get("document_id"),
+                        json.dumps({k: payload[k] for k in STORED_FIELDS if k in payload})
+                    )
+                )
+                conn.execute(
+                    "INSERT INTO entries_fts (rowid, content) VALUES (?, ?)",
+                    (cursor.lastrowid, payload.get("content", ""))
+                )
+    
+    def _search(self, brain_id: int, query: str, limit: int) -> List[Dict[str, Any]]:
+        if not self._path(brain_id).exists():
+            return []
+        
+        tokens = [token for token in QUERY_TOKEN_RE.findall(query.lower()) if token not in STOPWORDS]
+        if not tokens:
+            return []
+        match = " OR ".join('"' + token.replace('"', '""') + '"' for token in dict.fromkeys(tokens))
+        
+        with closing(self._connect(brain_id)) as conn, conn:
+            rows = conn.execute(
+                "SELECT entries.point_id, entries.payload, bm25(entries_fts) AS rank "
+                "FROM entries_fts JOIN entries ON entries.rowid = entries_fts.rowid "
+                "WHERE entries_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        
+        # FTS5 bm25() is lower-is-better; negate so higher scores are better
+        return [
+            {"id": point_id, "score": -rank, "payload": json.loads(payload)}
+            for point_id, payload, rank in rows
+        ]
+    
+    def _delete(self, brain_id: int, column: str, values: List[Any]):
+        if not values or not self._path(brain_id).exists():
+            return
+        with closing(self._connect(brain_id)) as conn, conn:
+            self._delete_rows(conn, column, values)
+    
+    async def add(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        """Index chunk contents under their vector point IDs."""
+        if point_ids:
+            await asyncio.to_thread(self._add, brain_id, point_ids, payloads)
+    
+    async def search(self, brain_id: int, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """BM25 search for any of the query's non-stopword terms.
+        
+        Results are dicts with id, score (BM25, higher is better) and payload.
+        """
+        return await asyncio.to_thread(self._search, brain_id, query, limit)
+    
+    async def delete_points(self, brain_id: int, point_ids: List[str]):
+        await asyncio.to_thread(self._delete, brain_id, "point_id", point_ids)
+    
+    async def delete_by_document(self, brain_id: int, document_id: int):
+        await asyncio.to_thread(self._delete, brain_id, "document_id", [document_id])
+    
+    async def delete_by_brain(self, brain_id: int):
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self._path(brain_id)}{suffix}").unlink(missing_ok=True)
+
+
+# Global instance
+lexical_index = LexicalIndex(settings.LEXICAL_INDEX_DIR)
@@ -1,8 +1,19 @@
 from openai import AsyncOpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from app.core.config import settings
 from app.services.embeddings import embedding_service
-from app.services.vector_store import vector_store
+from app.services.retrieval import hybrid_search
+from app.services.context_packer import context_packer
+from app.services.answer_cache import answer_cache, brain_versions
+
+# Payload fields needed to build context and sources
+CONTEXT_PAYLOAD_FIELDS = ["content", "document_id", "page", "file_type", "chunk_index", "chunk_hash"]
+
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant that answers questions based on the provided context. "
+    "Always base your answers on the context provided. If the context doesn't contain "
+    "relevant information, politely say so. Be concise and accurate."
+)
 
 
 class LLMService:
@@ -12,32 +23,52 @@ class LLMService:
         self.temperature = settings.LLM_TEMPERATURE
         self.max_tokens = settings.MAX_TOKENS
     
-    async def generate_response(
+    async def retrieve(
         self,
         query: str,
         brain_id: int,
-        chat_history: List[Dict[str, str]] = None,
-        max_context_docs: int = 5
-    ) -> Dict[str, Any]:
-        """Generate response using RAG."""
+        max_context_docs: int = 5,
+        brain_settings: Dict[str, Any] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve the chunks most relevant to a query."""
         # Create embedding for query
-        query_embedding = await embedding_service.create_embedding(query)
+        if query_embedding is None:
+            query_embedding = await embedding_service.create_embedding(query)
         
         # Search for relevant documents
-        search_results = vector_store.search(
+        return await hybrid_search(
+            query=query,
             query_vector=query_embedding,
             brain_id=brain_id,
             limit=max_context_docs,
-            score_threshold=0.7
+            score_threshold=0.7,
+            brain_settings=brain_settings,
+            payload_fields=CONTEXT_PAYLOAD_FIELDS
         )
+    
+    async def prepare_prompt(
+        self,
+        query: str,
+        brain_id: int,
+        chat_history: List[Dict[str, str]] = None,
+        max_context_docs: int = 5,
+        brain_settings: Dict[str, Any] = None,
+        summary: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], Dict[str, int]]:
+        """Retrieve context and pack the prompt into the token budget.
         
-        # Build context from search results
-        context_parts = []
-        sources = []
+        ``summary`` is the session's rolling summary of messages older than
+        ``chat_history``. Returns the messages, the sources that made it
+        into the prompt and the prompt token counts.
+        """
+        search_results = await self.retrieve(query, brain_id, max_context_docs, brain_settings, query_embedding)
+        packed = context_packer.pack(SYSTEM_PROMPT, query, search_results, chat_history, summary)
         
-        for result in search_results:
+        sources = []
+        for result in packed.results:
             payload = result["payload"]
-            context_parts.append(payload["content"])
             sources.append({
                 "document_id": payload["document_id"],
                 "content": payload["content"][:200] + "...",  # Preview
@@ -46,27 +77,63 @@ class LLMService:
                 "file_type": payload.get("file_type")
             })
         
-        context = "\n\n".join(context_parts)
+        return packed.messages, sources, packed.tokens
+    
+    async def lookup_cached_answer(
+        self,
+        query: str,
+        brain_id: int,
+        chat_history: List[Dict[str, str]] = None,
+        summary: Optional[str] = None
+    ) -> Tuple[List[float], Optional[int], Optional[Dict[str, Any]]]:
+        """Embed the query and check the semantic answer cache.
         
-        # Build messages for LLM
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful AI assistant that answers questions based on the provided context. "
-                    "Always base your answers on the context provided. If the context doesn't contain "
-                    "relevant information, politely say so. Be concise and accurate."
-                )
-            }
-        ]
+        Returns the query embedding, the brain version to cache a new
+        answer under (None if the answer must not be cached) and the cached
+        response on a hit. Only standalone questions are cached, since an
+        answer that depends on the conversation cannot be reused.
+        """
+        query_embedding = await embedding_service.create_embedding(query)
+        if not settings.ANSWER_CACHE_ENABLED or chat_history or summary:
+            return query_embedding, None, None
         
-        # Add chat history if provided
-        if chat_history:
-            messages.extend(chat_history[-10:])  # Last 10 messages
+        version = await brain_versions.get(brain_id)
+        if version is None:
+            return query_embedding, None, None
         
-        # Add current query with context
-        user_message = f"Context:\n{context}\n\nQuestion: {query}"
-        messages.append({"role": "user", "content": user_message})
+        cached = answer_cache.get(brain_id, query, query_embedding, version)
+        if cached is None:
+            return query_embedding, version, None
+        return query_embedding, version, {
+            **cached,
+            "tokens": {"prompt_tokens": 0, "completion_tokens": 0},
+            "cached": True
+        }
+    
+    async def generate_response(
+        self,
+        query: str,
+        brain_id: int,
+        chat_history: List[Dict[str, str]] = None,
+        max_context_docs: int = 5,
+        brain_settings: Dict[str, Any] = None,
+        summary: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate response using RAG.
+        
+        Standalone questions (no history or summary) are answered from the
+        semantic answer cache when a close enough question was answered
+        for the same brain version; such responses have ``cached`` set.
+        """
+        query_embedding, version, cached = await self.lookup_cached_answer(
+            query, brain_id, chat_history, summary
+        )
+        if cached is not None:
+            return cached
+        
+        messages, sources, tokens = await self.prepare_prompt(
+            query, brain_id, chat_history, max_context_docs, brain_settings, summary, query_embedding
+        )
         
         # Generate response
         response = await self.client.chat.completions.create(
@@ -77,12 +144,115 @@ class LLMService:
         )
         
         answer = response.choices[0].message.content
+        if response.usage is not None:
+            tokens["completion_tokens"] = response.usage.completion_tokens
+            tokens["api_prompt_tokens"] = response.usage.prompt_tokens
         
-        return {
+        response_data = {
             "answer": answer,
             "sources": sources,
-            "context_used": len(search_results) > 0
+            "context_used": len(sources) > 0
         }
+        if version is not None:
+            answer_cache.set(brain_id, query, query_embedding, version, response_data)
+        return {**response_data, "tokens": tokens}
+    
+    async def stream_response(
+        self,
+        query: str,
+        brain_id: int,
+        chat_history: List[Dict[str, str]] = None,
+        max_context_docs: int = 5,
+        brain_settings: Dict[str, Any] = None,
+        summary: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generate a RAG response as a stream of events.
+        
+        Yields ``{"type": "sources", "sources": [...], "tokens": {...}}``
+        once the prompt is packed, then ``{"type": "delta", "content": ...}``
+        per token chunk. Closing the generator early closes the completion
+        stream, so an abandoned answer stops being generated. A cached
+        answer (see generate_response) is sent as a single delta.
+        """
+        query_embedding, version, cached = await self.lookup_cached_answer(
+            query, brain_id, chat_history, summary
+        )
+        if cached is not None:
+            yield {"type": "sources", "sources": cached["sources"], "tokens": cached["tokens"], "cached": True}
+            yield {"type": "delta", "content": cached["answer"]}
+            return
+        
+        messages, sources, tokens = await self.prepare_prompt(
+            query, brain_id, chat_history, max_context_docs, brain_settings, summary, query_embedding
+        )
+        yield {"type": "sources", "sources": sources, "tokens": tokens}
+        answer_parts = []
+        
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer_parts.append(chunk.choices[0].delta.content)
+                    yield {"type": "delta", "content": chunk.choices[0].delta.content}
+        finally:
+            await stream.response.aclose()
+        
+        # Only complete answers are cached
+        if version is not None:
+            answer_cache.set(brain_id, query, query_embedding, version, {
+                "answer": "".join(answer_parts),
+                "sources": sources,
+                "context_used": len(sources) > 0
+            })
+    
+    async def summarize_conversation(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]]
+    ) -> str:
+        """Fold messages into a conversation's rolling summary."""
+        transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = f"Current summary:\n{previous_summary}\n\n" if previous_summary else ""
+        prompt += f"New messages:\n{transcript}"
+        
+        response = await self.client.chat.completions.create(
+            model=settings.CHAT_SUMMARY_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Update the summary of this conversation with the new messages. Keep facts, names, "
+                        "numbers, decisions and open questions the user may refer back to. Write in the third "
+                        "person, as compact prose. Return only the updated summary."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.2,
+            max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content.strip()
+    
+    def fallback_chat_title(self, first_message: str, max_words: int = 6, max_chars: int = 60) -> str:
+        """Cheap title from the first message, used until the generated title is ready."""
+        words = first_message.split()
+        if not words:
+            return "New Chat"
+        title = " ".join(words[:max_words])
+        if len(title) > max_chars:
+            title = title[:max_chars].rsplit(" ", 1)[0] or title[:max_chars]
+        if len(words) > max_words or len(title) < len(" ".join(words)):
+            title += "..."
+        return title
     
     async def generate_chat_title(self, first_message: str) -> str:
         """Generate a title for a chat session based on the first message."""
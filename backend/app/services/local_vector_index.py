@@ -0,0 +1,358 @@
+import asyncio
+import json
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from app.services.vector_backend import VectorBackend, point_ids_for, project_payload
+
+# Bound on SQL variables per statement (SQLite's default limit is 999)
+MAX_SQL_VARIABLES = 500
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS points ("
+    "point_id TEXT PRIMARY KEY, document_id INTEGER, chunk_hash TEXT, vector BLOB NOT NULL, payload TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_points_document_id ON points (document_id)",
+    # Bumped by every write so readers know when a cached matrix is stale
+    "CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0)",
+]
+
+
+def _batches(values: List[Any]) -> List[List[Any]]:
+    return [values[i:i + MAX_SQL_VARIABLES] for i in range(0, len(values), MAX_SQL_VARIABLES)]
+
+
+class _BrainMatrix:
+    """Cached vectors of one brain at a write generation."""
+    
+    def __init__(self, generation: int, ids: List[str], matrix: np.ndarray):
+        self.generation = generation
+        self.ids = ids
+        self.matrix = matrix
+
+
+class LocalVectorIndex(VectorBackend):
+    """In-process brute-force vector index for small brains.
+    
+    Each brain is a SQLite database under the root directory with one row
+    per point: its L2-normalised float32 vector, payload and document ID.
+    Writes are row-level transactions, so processes sharing the directory
+    see each other's writes atomically and never a half-written index.
+    Search is a single matrix-vector product over the brain's vectors
+    followed by an ``argpartition`` top-k, so cosine scores match Qdrant's;
+    only the hits' payloads are read.
+    
+    Each process caches the vector matrices (not payloads) of the
+    ``cache_brains`` most recently used brains, and reloads a brain's
+    matrix when its write generation has changed.
+    """
+    
+    def __init__(self, root: Path, cache_brains: int = 32):
+        self.root = Path(root)
+        self.cache_brains = cache_brains
+        self._cache: "OrderedDict[int, _BrainMatrix]" = OrderedDict()
+        # Searches run in worker threads
+        self._cache_lock = threading.Lock()
+    
+    def _path(self, brain_id: int) -> Path:
+        return self.root / f"{brain_id}.sqlite3"
+    
+    def _legacy_dir(self, brain_id: int) -> Path:
+        """Directory of the original points.json + .npy layout."""
+        return self.root / str(brain_id)
+    
+    def exists(self, brain_id: int) -> bool:
+        return self._path(brain_id).exists() or (self._legacy_dir(brain_id) / "points.json").exists()
+    
+    def _open(self, brain_id: int, create: bool = False) -> Optional[sqlite3.Connection]:
+        """Connect to a brain's database, or return None if it has none and ``create`` is off."""
+        legacy = (self._legacy_dir(brain_id) / "points.json").exists()
+        if not (create or legacy or self._path(brain_id).exists()):
+            return None
+        
+        self.root.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path(brain_id), timeout=30)
+        has_schema = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'generation'").fetchone()
+        if not has_schema or legacy:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                if legacy:
+                    self._migrate_legacy(conn, brain_id)
+        return conn
+    
+    def _migrate_legacy(self, conn: sqlite3.Connection, brain_id: int):
+        """Import a brain stored in the original layout, then remove it."""
+        legacy_dir = self._legacy_dir(brain_id)
+        try:
+            with open(legacy_dir / "points.json", encoding="utf-8") as f:
+                points = json.load(f)
+            matrix = np.load(legacy_dir / points["vectors_file"]) if points["ids"] else None
+        except FileNotFoundError:
+            # Another process migrated it first
+            return
+        
+        if matrix is not None:
+            conn.executemany(
+                "INSERT OR IGNORE INTO points (point_id, document_id, chunk_hash, vector, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        point_id,
+                        payload.get("document_id"),
+                        payload.get("chunk_hash"),
+                        np.ascontiguousarray(vector, dtype=np.float32).tobytes(),
+                        json.dumps(payload)
+                    )
+                    for point_id, vector, payload in zip(points["ids"], matrix, points["payloads"])
+                ]
+            )
+            self._bump(conn)
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _bump(conn: sqlite3.Connection):
+        conn.execute("UPDATE generation SET value = value + 1")
+    
+    def _matrix(self, conn: sqlite3.Connection, brain_id: int) -> _BrainMatrix:
+        """The brain's vectors, from cache if unchanged. Call inside a read transaction."""
+        generation = conn.execute("SELECT value FROM generation").fetchone()[0]
+        with self._cache_lock:
+            cached = self._cache.get(brain_id)
+            if cached is not None and cached.generation == generation:
+                self._cache.move_to_end(brain_id)
+                return cached
+        
+        rows = conn.execute("SELECT point_id, vector FROM points").fetchall()
+        if rows:
+            matrix = np.frombuffer(b"".join(vector for _, vector in rows), dtype=np.float32).reshape(len(rows), -1)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        loaded = _BrainMatrix(generation, [point_id for point_id, _ in rows], matrix)
+        
+        with self._cache_lock:
+            self._cache[brain_id] = loaded
+            self._cache.move_to_end(brain_id)
+            while len(self._cache) > self.cache_brains:
+                self._cache.popitem(last=False)
+        return loaded
+    
+    @staticmethod
+    def _payloads(conn: sqlite3.Connection, point_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        payloads = {}
+        for batch in _batches(point_ids):
+            marks = ", ".join("?" * len(batch))
+            for point_id, payload in conn.execute(
+                f"SELECT point_id, payload FROM points WHERE point_id IN ({marks})", batch
+            ):
+                payloads[point_id] = json.loads(payload)
+        return payloads
+    
+    @staticmethod
+    def _normalise(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    @staticmethod
+    def _query(query_vector: List[float]) -> Optional[np.ndarray]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else None
+    
+    def _add(self, vectors, payloads, brain_id, document_id, point_ids) -> List[str]:
+        new = self._normalise(np.asarray(vectors, dtype=np.float32))
+        new_ids = list(point_ids) if point_ids is not None else point_ids_for(payloads, document_id)
+        for payload in payloads:
+            payload["brain_id"] = brain_id
+            payload["document_id"] = document_id
+        
+        with closing(self._open(brain_id, create=True)) as conn, conn:
+            # Points whose IDs are stored again are overwritten
+            conn.executemany(
+                "INSERT OR REPLACE INTO points (point_id, document_id, chunk_hash, vector, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (point_id, document_id, payload.get("chunk_hash"), vector.tobytes(), json.dumps(payload))
+                    for point_id, vector, payload in zip(new_ids, new, payloads)
+                ]
+            )
+            self._bump(conn)
+        
+        return new_ids
+    
+    def _search(
+        self, query_vector, brain_id, limit, score_threshold, payload_fields, exclude_fields, with_vectors
+    ) -> List[Dict[str, Any]]:
+        query = self._query(query_vector)
+        conn = self._open(brain_id)
+        if conn is None or query is None or limit <= 0:
+            return []
+        
+        with closing(conn), conn:
+            # One read transaction, so payloads match the matrix's snapshot
+            conn.execute("BEGIN")
+            index = self._matrix(conn, brain_id)
+            if not index.ids:
+                return []
+            
+            scores = index.matrix @ query
+            k = min(limit, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = [int(i) for i in top[np.argsort(-scores[top])]]
+            if score_threshold is not None:
+                top = [i for i in top if scores[i] >= score_threshold]
+            payloads = self._payloads(conn, [index.ids[i] for i in top])
+        
+        results = []
+        for i in top:
+            result = {
+                "id": index.ids[i],
+                "score": float(scores[i]),
+                "payload": project_payload(payloads.get(index.ids[i], {}), payload_fields, exclude_fields)
+            }
+            if with_vectors:
+                # Stored vectors are L2-normalised
+                result["vector"] = index.matrix[i].tolist()
+            results.append(result)
+        return results
+    
+    def _set_payloads(self, brain_id, point_ids, payloads):
+        conn = self._open(brain_id)
+        if conn is None:
+            return
+        with closing(conn), conn:
+            conn.executemany(
+                "UPDATE points SET document_id = ?, chunk_hash = ?, payload = ? WHERE point_id = ?",
+                [
+                    (payload.get("document_id"), payload.get("chunk_hash"), json.dumps(payload), point_id)
+                    for point_id, payload in zip(point_ids, payloads)
+                ]
+            )
+            self._bump(conn)
+    
+    def _score_points(self, query_vector, brain_id, point_ids) -> Dict[str, float]:
+        query = self._query(query_vector)
+        conn = self._open(brain_id)
+        if conn is None or query is None or not point_ids:
+            return {}
+        
+        scores = {}
+        with closing(conn), conn:
+            for batch in _batches(list(point_ids)):
+                marks = ", ".join("?" * len(batch))
+                for point_id, vector in conn.execute(
+                    f"SELECT point_id, vector FROM points WHERE point_id IN ({marks})", batch
+                ):
+                    scores[point_id] = float(np.frombuffer(vector, dtype=np.float32) @ query)
+        return scores
+    
+    def _get_chunk_hashes(self, brain_id, document_id) -> Dict[str, List[str]]:
+        hashes: Dict[str, List[str]] = {}
+        conn = self._open(brain_id)
+        if conn is None:
+            return hashes
+        with closing(conn), conn:
+            for point_id, chunk_hash in conn.execute(
+                "SELECT point_id, chunk_hash FROM points WHERE document_id = ?", (document_id,)
+            ):
+                hashes.setdefault(chunk_hash or "", []).append(point_id)
+        return hashes
+    
+    def _delete(self, brain_id: int, column: str, values: List[Any]):
+        conn = self._open(brain_id)
+        if conn is None or not values:
+            return
+        with closing(conn), conn:
+            deleted = 0
+            for batch in _batches(values):
+                marks = ", ".join("?" * len(batch))
+                deleted += conn.execute(f"DELETE FROM points WHERE {column} IN ({marks})", batch).rowcount
+            if deleted:
+                self._bump(conn)
+    
+    def _count(self, brain_id: int) -> int:
+        conn = self._open(brain_id)
+        if conn is None:
+            return 0
+        with closing(conn), conn:
+            return conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+    
+    def _delete_brain(self, brain_id: int):
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self._path(brain_id)}{suffix}").unlink(missing_ok=True)
+        shutil.rmtree(self._legacy_dir(brain_id), ignore_errors=True)
+    
+    async def add_vectors(
+        self,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        brain_id: int,
+        document_id: int,
+        point_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        return await asyncio.to_thread(self._add, vectors, payloads, brain_id, document_id, point_ids)
+    
+    async def search(
+        self,
+        query_vector: List[float],
+        brain_id: int,
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        brain_settings: Optional[Dict[str, Any]] = None,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self._search, query_vector, brain_id, limit, score_threshold,
+            payload_fields, exclude_fields, with_vectors
+        )
+    
+    async def set_payloads(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        if point_ids:
+            await asyncio.to_thread(self._set_payloads, brain_id, point_ids, payloads)
+    
+    async def score_points(self, query_vector: List[float], brain_id: int, point_ids: List[str]) -> Dict[str, float]:
+        return await asyncio.to_thread(self._score_points, query_vector, brain_id, point_ids)
+    
+    async def get_chunk_hashes(self, brain_id: int, document_id: int) -> Dict[str, List[str]]:
+        return await asyncio.to_thread(self._get_chunk_hashes, brain_id, document_id)
+    
+    async def delete_points(self, brain_id: int, point_ids: List[str]):
+        await asyncio.to_thread(self._delete, brain_id, "point_id", list(point_ids))
+    
+    async def delete_by_document(self, brain_id: int, document_id: int):
+        await asyncio.to_thread(self._delete, brain_id, "document_id", [document_id])
+    
+    async def delete_by_brain(self, brain_id: int):
+        with self._cache_lock:
+            self._cache.pop(brain_id, None)
+        await asyncio.to_thread(self._delete_brain, brain_id)
+    
+    async def count(self, brain_id: int) -> int:
+        return await asyncio.to_thread(self._count, brain_id)
+    
+    def iter_points(self, brain_id: int, batch_size: int = 256) -> Iterator[Tuple[List[str], np.ndarray, List[Dict[str, Any]]]]:
+        """Yield (ids, vectors, payloads) batches of a brain's points from one snapshot."""
+        conn = self._open(brain_id)
+        if conn is None:
+            return
+        with closing(conn), conn:
+            conn.execute("BEGIN")
+            cursor = conn.execute("SELECT point_id, vector, payload FROM points")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield (
+                    [point_id for point_id, _, _ in rows],
+                    np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector, _ in rows]),
+                    [json.loads(payload) for _, _, payload in rows]
+                )
@@ -0,0 +1,178 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.lexical_index import lexical_index
+from app.services.vector_backend import project_payload, merge_results
+from app.services.vector_store import vector_store
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    k: int = 60,
+    limit: int = 10
+) -> List[Dict[str, Any]]:
+    """Fuse ranked result lists with reciprocal rank fusion.
+    
+    Each result gets a ``rank_score`` of sum(1 / (k + rank)) over the lists
+    it appears in, and results are ordered by it. Results are matched by
+    id; the other fields (score, payload) come from the first list the
+    result appears in.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {**result, "rank_score": 0.0}
+            entry["rank_score"] += 1.0 / (k + rank)
+    
+    return sorted(fused.values(), key=lambda r: r["rank_score"], reverse=True)[:limit]
+
+
+async def apply_dense_floor(
+    lexical: List[Dict[str, Any]],
+    dense: List[Dict[str, Any]],
+    query_vector: List[float],
+    min_score: float
+) -> List[Dict[str, Any]]:
+    """Keep lexical hits whose vectors are at least ``min_score`` similar to the query.
+    
+    Hits the dense retriever also found reuse its score; the others are
+    scored against their stored vectors, one call per brain. Kept hits
+    keep their lexical order, with ``score`` replaced by the cosine
+    similarity so fused results carry comparable scores.
+    """
+    dense_scores = {result["id"]: result["score"] for result in dense}
+    unscored: Dict[int, List[str]] = {}
+    for result in lexical:
+        if result["id"] not in dense_scores:
+            unscored.setdefault(result["payload"]["brain_id"], []).append(result["id"])
+    
+    brain_scores = await asyncio.gather(*(
+        vector_store.score_points(query_vector, brain_id, point_ids)
+        for brain_id, point_ids in unscored.items()
+    ))
+    for scores in brain_scores:
+        dense_scores.update(scores)
+    
+    return [
+        {**result, "score": dense_scores[result["id"]]}
+        for result in lexical
+        if dense_scores.get(result["id"], -1.0) >= min_score
+    ]
+
+
+async def hybrid_search(
+    query: str,
+    query_vector: List[float],
+    brain_id: int,
+    limit: int = 10,
+    score_threshold: float = 0.7,
+    brain_settings: Optional[Dict[str, Any]] = None,
+    payload_fields: Optional[List[str]] = None,
+    exclude_fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Dense + BM25 retrieval fused with RRF.
+    
+    Dense results respect ``score_threshold``. Lexical matches only need a
+    cosine similarity of HYBRID_LEXICAL_MIN_SCORE (or ``score_threshold``,
+    if lower), which recovers exact identifiers the embedding ranks low
+    without letting unrelated keyword matches through. Every result's
+    ``score`` is its cosine similarity; the fused order is ``rank_score``.
+    With HYBRID_SEARCH_ENABLED off this is plain dense search. The payload
+    projection applies to both retrievers.
+    """
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return await vector_store.search(
+            query_vector=query_vector,
+            brain_id=brain_id,
+            limit=limit,
+            score_threshold=score_threshold,
+            brain_settings=brain_settings,
+            payload_fields=payload_fields,
+            exclude_fields=exclude_fields
+        )
+    
+    candidates = limit * settings.HYBRID_CANDIDATE_MULTIPLIER
+    dense, lexical = await asyncio.gather(
+        vector_store.search(
+            query_vector=query_vector,
+            brain_id=brain_id,
+            limit=candidates,
+            score_threshold=score_threshold,
+            brain_settings=brain_settings,
+            payload_fields=payload_fields,
+            exclude_fields=exclude_fields
+        ),
+        lexical_index.search(brain_id, query, limit=candidates)
+    )
+    lexical = await apply_dense_floor(
+        lexical, dense, query_vector, min(settings.HYBRID_LEXICAL_MIN_SCORE, score_threshold)
+    )
+    for result in lexical:
+        result["payload"] = project_payload(result["payload"], payload_fields, exclude_fields)
+    
+    return reciprocal_rank_fusion([dense, lexical], k=settings.HYBRID_RRF_K, limit=limit)
+
+
+def dedupe_by_content(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop results whose chunk content already appeared higher in the list.
+    
+    The same file uploaded to several brains yields identical chunks; only
+    the best-ranked copy is kept. Results without a chunk_hash are kept.
+    """
+    seen = set()
+    deduped = []
+    for result in results:
+        chunk_hash = result["payload"].get("chunk_hash")
+        if chunk_hash is not None:
+            if chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+        deduped.append(result)
+    return deduped
+
+
+async def federated_search(
+    query: str,
+    query_vector: List[float],
+    brain_ids: List[int],
+    limit: int = 10,
+    score_threshold: float = 0.7,
+    payload_fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Hybrid search over several brains at once.
+    
+    The dense side is a single filtered query per Qdrant collection (see
+    VectorStore.search_many). Lexical hits from each brain's index are
+    merged by BM25 score, which is only approximately comparable across
+    brains but is smoothed out by RRF, and pass the same dense floor as in
+    hybrid_search. Callers must have checked access to every brain in
+    ``brain_ids``.
+    """
+    if not brain_ids:
+        return []
+    
+    if payload_fields is not None:
+        payload_fields = list(dict.fromkeys(payload_fields + ["chunk_hash"]))
+    candidates = limit * settings.HYBRID_CANDIDATE_MULTIPLIER
+    
+    dense_search = vector_store.search_many(
+        query_vector, brain_ids, candidates, score_threshold, payload_fields=payload_fields
+    )
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return dedupe_by_content(await dense_search)[:limit]
+    
+    dense, *lexical_lists = await asyncio.gather(dense_search, *(
+        lexical_index.search(brain_id, query, limit=candidates) for brain_id in brain_ids
+    ))
+    lexical = await apply_dense_floor(
+        merge_results(lexical_lists, candidates), dense, query_vector,
+        min(settings.HYBRID_LEXICAL_MIN_SCORE, score_threshold)
+    )
+    for result in lexical:
+        result["payload"] = project_payload(result["payload"], payload_fields)
+    
+    fused = reciprocal_rank_fusion([dense, lexical], k=settings.HYBRID_RRF_K, limit=candidates)
+    return dedupe_by_content(fused)[:limit]
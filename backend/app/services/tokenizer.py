@@ -0,0 +1,16 @@
+from functools import lru_cache
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Return the tiktoken encoding for a model, falling back to cl100k_base."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count tokens in text for a model."""
+    return len(get_encoding(model).encode_ordinary(text))
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+# Namespace for deterministic chunk point IDs
+POINT_ID_NAMESPACE = uuid.UUID("6f1d8f4e-3b8a-5c2e-9a47-0d6b1c5e8a21")
+
+
+def point_id_for(document_id: int, chunk_index: int, chunk_hash: str) -> str:
+    """Deterministic point ID for a document chunk.
+    
+    Storing the same chunk again overwrites its point instead of adding a
+    duplicate, so retried or repeated ingestion is idempotent.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{document_id}:{chunk_index}:{chunk_hash}"))
+
+
+def point_ids_for(payloads: List[Dict[str, Any]], document_id: int) -> List[str]:
+    """Point IDs for payloads, deterministic where chunk_index/chunk_hash are present."""
+    return [
+        point_id_for(document_id, payload["chunk_index"], payload["chunk_hash"])
+        if "chunk_index" in payload and "chunk_hash" in payload
+        else str(uuid.uuid4())
+        for payload in payloads
+    ]
+
+
+def project_payload(
+    payload: Dict[str, Any],
+    payload_fields: Optional[List[str]] = None,
+    exclude_fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Apply a search payload projection to a payload dict."""
+    if payload_fields is not None:
+        payload = {k: payload[k] for k in payload_fields if k in payload}
+    if exclude_fields:
+        payload = {k: v for k, v in payload.items() if k not in exclude_fields}
+    return payload
+
+
+def merge_results(result_lists: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """Merge scored result lists into one top-``limit`` list, keeping the best hit per point ID."""
+    best: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for result in results:
+            current = best.get(result["id"])
+            if current is None or result["score"] > current["score"]:
+                best[result["id"]] = result
+    return sorted(best.values(), key=lambda r: r["score"], reverse=True)[:limit]
+
+
+class VectorBackend(ABC):
+    """Storage and search for one brain's chunk vectors.
+    
+    Implementations: QdrantBackend (app.services.vector_store) and
+    LocalVectorIndex (app.services.local_vector_index). Every stored
+    payload carries ``brain_id`` and ``document_id``.
+    """
+    
+    @abstractmethod
+    async def add_vectors(
+        self,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        brain_id: int,
+        document_id: int,
+        point_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Store vectors and return their point IDs.
+        
+        Points with an existing ID are overwritten. Without ``point_ids``,
+        IDs come from point_ids_for.
+        """
+    
+    @abstractmethod
+    async def search(
+        self,
+        query_vector: List[float],
+        brain_id: int,
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        brain_settings: Optional[Dict[str, Any]] = None,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Return the top matches as dicts with id, score and payload.
+        
+        ``payload_fields`` limits payloads to those keys and
+        ``exclude_fields`` drops keys (see project_payload). With
+        ``with_vectors`` each match also has a ``vector``.
+        """
+    
+    async def search_many(
+        self,
+        query_vector: List[float],
+        brain_ids: List[int],
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search several brains and merge the matches by score.
+        
+        The default runs one search per brain; backends that can filter on
+        many brains in a single query override it.
+        """
+        result_lists = await asyncio.gather(*(
+            self.search(
+                query_vector, brain_id, limit, score_threshold,
+                payload_fields=payload_fields, exclude_fields=exclude_fields
+            )
+            for brain_id in brain_ids
+        ))
+        return merge_results(result_lists, limit)
+    
+    @abstractmethod
+    async def set_payloads(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        """Replace the payloads of existing points, keeping their vectors.
+        
+        Payloads must be complete, including ``brain_id`` and ``document_id``.
+        """
+    
+    @abstractmethod
+    async def score_points(self, query_vector: List[float], brain_id: int, point_ids: List[str]) -> Dict[str, float]:
+        """Cosine similarity of the query to specific points; missing points are left out."""
+    
+    @abstractmethod
+    async def get_chunk_hashes(self, brain_id: int, document_id: int) -> Dict[str, List[str]]:
+        """Map chunk content hash to point IDs for a document."""
+    
+    @abstractmethod
+    async def delete_points(self, brain_id: int, point_ids: List[str]):
+        """Delete a brain's vectors by point ID."""
+    
+    @abstractmethod
+    async def delete_by_document(self, brain_id: int, document_id: int):
+        """Delete all vectors for a document."""
+    
+    @abstractmethod
+    async def delete_by_brain(self, brain_id: int):
+        """Delete all vectors for a brain."""
+    
+    @abstractmethod
+    async def count(self, brain_id: int) -> int:
+        """Number of vectors stored for a brain."""
+    
+    async def sync(self, brain_id: int):
+        """Wait until all writes issued for a brain are applied and searchable."""
@@ -1,49 +1,349 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from typing import List, Dict, Any, Optional
+import asyncio
+import time
+import httpx
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, PointIdsList,
+    PayloadSchemaType, HnswConfigDiff, CollectionParamsDiff, ShardingMethod,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization,
+    BinaryQuantizationConfig, QuantizationSearchParams, SearchParams, VectorParamsDiff,
+    PayloadSelectorInclude, PayloadSelectorExclude, MatchAny, HasIdCondition,
+    OverwritePayloadOperation, SetPayload
+)
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple, Callable, Awaitable
 from app.core.config import settings
-import uuid
+from app.db.session import AsyncSessionLocal
+from app.models.models import Brain
+from app.services.local_vector_index import LocalVectorIndex
+from app.services.vector_backend import VectorBackend, point_ids_for, merge_results
+import json
 
+# Payload fields filtered on by search and delete, with their index types
+PAYLOAD_INDEXES = {
+    "brain_id": PayloadSchemaType.INTEGER,
+    "document_id": PayloadSchemaType.INTEGER,
+    "chunk_hash": PayloadSchemaType.KEYWORD,
+    "file_type": PayloadSchemaType.KEYWORD,
+}
 
-class VectorStore:
-    def __init__(self):
-        self.client = QdrantClient(
+
+def payload_selector(
+    payload_fields: Optional[List[str]] = None,
+    exclude_fields: Optional[List[str]] = None
+):
+    """Qdrant ``with_payload`` value for a search projection."""
+    if payload_fields is not None:
+        fields = [k for k in payload_fields if not exclude_fields or k not in exclude_fields]
+        return PayloadSelectorInclude(include=fields) if fields else False
+    if exclude_fields:
+        return PayloadSelectorExclude(exclude=exclude_fields)
+    return True
+
+
+# Placement strategies (QDRANT_PLACEMENT_STRATEGY)
+PLACEMENT_SHARED = "shared"  # One collection for every tenant
+PLACEMENT_ORGANIZATION = "organization"  # One collection per organization
+PLACEMENT_SHARD_KEY = "shard_key"  # One custom-sharded collection, one shard key per organization
+PLACEMENT_STRATEGIES = [PLACEMENT_SHARED, PLACEMENT_ORGANIZATION, PLACEMENT_SHARD_KEY]
+
+
+# Quantization modes (QDRANT_QUANTIZATION)
+QUANTIZATION_NONE = "none"
+QUANTIZATION_SCALAR = "scalar"  # int8, ~4x less vector RAM
+QUANTIZATION_BINARY = "binary"  # 1 bit per dimension, ~32x less vector RAM
+
+
+def quantization_config(mode: str = None):
+    """Build the Qdrant quantization config for a mode, or None if disabled."""
+    mode = mode or settings.QDRANT_QUANTIZATION
+    if mode == QUANTIZATION_NONE:
+        return None
+    if mode == QUANTIZATION_SCALAR:
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=settings.QDRANT_QUANTIZATION_QUANTILE,
+                always_ram=True
+            )
+        )
+    if mode == QUANTIZATION_BINARY:
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def search_params_for(brain_settings: Optional[Dict[str, Any]] = None) -> Optional[SearchParams]:
+    """Search parameters, with per-brain overrides from Brain.settings.
+    
+    Recognised keys: ``search_hnsw_ef``, ``search_oversampling`` and
+    ``search_rescore``. Quantization parameters only apply to quantized
+    collections.
+    """
+    brain_settings = brain_settings or {}
+    hnsw_ef = brain_settings.get("search_hnsw_ef", settings.QDRANT_SEARCH_HNSW_EF)
+    quantization = None
+    
+    if settings.QDRANT_QUANTIZATION != QUANTIZATION_NONE:
+        quantization = QuantizationSearchParams(
+            rescore=brain_settings.get("search_rescore", settings.QDRANT_QUANTIZATION_RESCORE),
+            oversampling=brain_settings.get("search_oversampling", settings.QDRANT_QUANTIZATION_OVERSAMPLING)
+        )
+    
+    if hnsw_ef is None and quantization is None:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+
+
+class Placement(NamedTuple):
+    """Where a brain's vectors live."""
+    collection_name: str
+    shard_key: Optional[str] = None
+
+
+class QdrantBackend(VectorBackend):
+    """Vector backend storing brains in Qdrant collections.
+    
+    Brain routes are read with ``session_factory``, which ingestion
+    workers point at their bounded pool (see VectorStore.use_session_factory).
+    """
+    
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.client = AsyncQdrantClient(
             url=f"http://{settings.QDRANT_HOST}:{settings.QDRANT_PORT}",
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
             api_key=settings.QDRANT_API_KEY,
-            prefer_grpc=False
+            timeout=settings.QDRANT_TIMEOUT,
+            # REST connection pool (unused when gRPC is preferred)
+            limits=httpx.Limits(
+                max_connections=settings.QDRANT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.QDRANT_MAX_CONNECTIONS
+            )
         )
         self.collection_name = settings.QDRANT_COLLECTION_NAME
-        self._ensure_collection()
-    
-    def _ensure_collection(self):
-        """Create collection if it doesn't exist."""
-        collections = self.client.get_collections().collections
-        collection_names = [col.name for col in collections]
-        
-        if self.collection_name not in collection_names:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=settings.EMBEDDING_DIMENSION,
-                    distance=Distance.COSINE
+        self.search_timeout = settings.QDRANT_SEARCH_TIMEOUT
+        self._ready_collections = set()
+        self._collection_lock = asyncio.Lock()
+        self._shard_keys = set()
+        # brain_id -> (placement, cached_at)
+        self._routes: Dict[int, Tuple[Placement, float]] = {}
+        self.route_ttl = settings.QDRANT_ROUTE_CACHE_TTL
+    
+    def placement_for(self, organization_id: int, strategy: str = None) -> Placement:
+        """Return the placement a new brain of an organization gets under a strategy."""
+        strategy = strategy or settings.QDRANT_PLACEMENT_STRATEGY
+        if strategy == PLACEMENT_SHARED:
+            return Placement(self.collection_name)
+        if strategy == PLACEMENT_ORGANIZATION:
+            return Placement(f"{self.collection_name}_org_{organization_id}")
+        if strategy == PLACEMENT_SHARD_KEY:
+            return Placement(f"{self.collection_name}_sharded", f"org_{organization_id}")
+        raise ValueError(f"Unknown placement strategy: {strategy}")
+    
+    def set_route(self, brain_id: int, placement: Placement):
+        """Cache a brain's placement in this process."""
+        self._routes[brain_id] = (placement, time.monotonic())
+    
+    def invalidate_route(self, brain_id: int):
+        self._routes.pop(brain_id, None)
+    
+    async def route(self, brain_id: int) -> Placement:
+        """Resolve a brain's placement from the routing table, cached in process.
+        
+        Brains without a recorded placement predate placement strategies and
+        live in the shared collection.
+        """
+        cached = self._routes.get(brain_id)
+        if cached is not None and time.monotonic() - cached[1] < self.route_ttl:
+            placement = cached[0]
+            await self._ensure_placement(placement)
+            return placement
+        
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Brain.vector_collection, Brain.vector_shard_key).where(Brain.id == brain_id)
+            )
+            row = result.one_or_none()
+        
+        if row is None or not row.vector_collection:
+            placement = Placement(self.collection_name)
+        else:
+            placement = Placement(row.vector_collection, row.vector_shard_key)
+        
+        await self._ensure_placement(placement)
+        self.set_route(brain_id, placement)
+        return placement
+    
+    async def _ensure_placement(self, placement: Placement):
+        """Make sure the collection (and shard key, if any) for a placement exist."""
+        await self._ensure_collection(placement.collection_name, sharded=placement.shard_key is not None)
+        
+        if placement.shard_key is None or placement in self._shard_keys:
+            return
+        
+        try:
+            await self.client.create_shard_key(
+                collection_name=placement.collection_name,
+                shard_key=placement.shard_key
+            )
+        except Exception as e:
+            # REST and gRPC report an existing shard key differently
+            if "already exists" not in str(e):
+                raise
+        self._shard_keys.add(placement)
+    
+    async def _ensure_collection(self, collection_name: str = None, sharded: bool = False):
+        """Create or migrate a collection to the declared schema (once per process).
+        
+        The live collection is compared against PAYLOAD_INDEXES and the HNSW /
+        payload storage settings, and only the differences are applied. This
+        makes the bootstrap idempotent and upgrades collections created by any
+        earlier version.
+        """
+        collection_name = collection_name or self.collection_name
+        if collection_name in self._ready_collections:
+            return
+        
+        async with self._collection_lock:
+            if collection_name in self._ready_collections:
+                return
+            
+            collections = (await self.client.get_collections()).collections
+            collection_names = [col.name for col in collections]
+            
+            if collection_name not in collection_names:
+                await self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(
+                        size=settings.EMBEDDING_DIMENSION,
+                        distance=Distance.COSINE,
+                        # Originals stay on disk for rescoring when quantized
+                        on_disk=settings.QDRANT_QUANTIZATION != QUANTIZATION_NONE
+                    ),
+                    quantization_config=quantization_config(),
+                    hnsw_config=HnswConfigDiff(
+                        m=settings.QDRANT_HNSW_M,
+                        ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
+                    ),
+                    on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD,
+                    sharding_method=ShardingMethod.CUSTOM if sharded else None
+                )
+            
+            await self._migrate_collection(collection_name)
+            self._ready_collections.add(collection_name)
+    
+    async def _migrate_collection(self, collection_name: str):
+        """Bring an existing collection's indexes and config up to date."""
+        info = await self.client.get_collection(collection_name)
+        
+        # Payload indexes used by search and delete filters
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            existing = info.payload_schema.get(field_name)
+            if existing is None or existing.data_type != field_schema:
+                await self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=True
+                )
+        
+        hnsw = info.config.hnsw_config
+        if (hnsw.m, hnsw.ef_construct) != (settings.QDRANT_HNSW_M, settings.QDRANT_HNSW_EF_CONSTRUCT):
+            await self.client.update_collection(
+                collection_name=collection_name,
+                hnsw_config=HnswConfigDiff(
+                    m=settings.QDRANT_HNSW_M,
+                    ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
                 )
             )
+        
+        quantization = quantization_config()
+        # Compare by kind only: re-applying quantization rebuilds the index
+        if quantization is not None and type(info.config.quantization_config) is not type(quantization):
+            await self.client.update_collection(
+                collection_name=collection_name,
+                vectors_config={"": VectorParamsDiff(on_disk=True)},
+                quantization_config=quantization
+            )
+        
+        if bool(info.config.params.on_disk_payload) != settings.QDRANT_ON_DISK_PAYLOAD:
+            await self.client.update_collection(
+                collection_name=collection_name,
+                collection_params=CollectionParamsDiff(on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD)
+            )
+    
+    @staticmethod
+    def _match(key: str, value: Any) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(
+                    key=key,
+                    match=MatchValue(value=value)
+                )
+            ]
+        )
+    
+    @staticmethod
+    def _point_size(point: PointStruct) -> int:
+        """Rough serialized size of a point in bytes (JSON floats dominate)."""
+        return len(point.vector) * 12 + len(json.dumps(point.payload, default=str))
+    
+    def _upsert_batches(self, points: List[PointStruct]) -> List[List[PointStruct]]:
+        """Split points into batches bounded by count and estimated request size."""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for point in points:
+            size = self._point_size(point)
+            if batch and (
+                len(batch) >= settings.QDRANT_UPSERT_BATCH_SIZE
+                or batch_bytes + size > settings.QDRANT_UPSERT_BATCH_BYTES
+            ):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(point)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    async def _upsert(self, placement: Placement, points: List[PointStruct], wait: bool):
+        """Upsert points in size-bounded batches, up to QDRANT_UPSERT_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(settings.QDRANT_UPSERT_CONCURRENCY)
+        
+        async def send(batch: List[PointStruct]):
+            async with semaphore:
+                await self.client.upsert(
+                    collection_name=placement.collection_name,
+                    points=batch,
+                    wait=wait,
+                    shard_key_selector=placement.shard_key
+                )
+        
+        await asyncio.gather(*(send(batch) for batch in self._upsert_batches(points)))
     
-    def add_vectors(
+    async def add_vectors(
         self,
         vectors: List[List[float]],
         payloads: List[Dict[str, Any]],
         brain_id: int,
-        document_id: int
+        document_id: int,
+        point_ids: Optional[List[str]] = None
     ) -> List[str]:
-        """Add vectors to the collection."""
+        """Add vectors to the brain's collection.
+        
+        Batches are sent with ``wait=False``: Qdrant acknowledges them once
+        they are in its write-ahead log. Call sync() before relying on them
+        being searchable.
+        """
+        placement = await self.route(brain_id)
+        vector_ids = list(point_ids) if point_ids is not None else point_ids_for(payloads, document_id)
         points = []
-        vector_ids = []
         
-        for i, (vector, payload) in enumerate(zip(vectors, payloads)):
-            vector_id = str(uuid.uuid4())
-            vector_ids.append(vector_id)
-            
+        for vector_id, vector, payload in zip(vector_ids, vectors, payloads):
             # Add brain_id and document_id to payload for filtering
             payload["brain_id"] = brain_id
             payload["document_id"] = document_id
@@ -56,74 +356,544 @@ class VectorStore:
                 )
             )
         
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
-        )
+        await self._upsert(placement, points, wait=False)
         
         return vector_ids
     
-    def search(
+    async def upsert_points(
+        self,
+        brain_id: int,
+        point_ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]]
+    ):
+        """Store points with existing IDs and complete payloads, waiting until applied."""
+        placement = await self.route(brain_id)
+        await self._upsert(
+            placement,
+            [
+                PointStruct(id=point_id, vector=vector, payload=payload)
+                for point_id, vector, payload in zip(point_ids, vectors, payloads)
+            ],
+            wait=True
+        )
+    
+    async def set_payloads(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        """Overwrite the payloads of existing points in one request.
+        
+        Sent with ``wait=False`` like add_vectors; sync() covers it.
+        """
+        if not point_ids:
+            return
+        placement = await self.route(brain_id)
+        await self.client.batch_update_points(
+            collection_name=placement.collection_name,
+            update_operations=[
+                OverwritePayloadOperation(
+                    overwrite_payload=SetPayload(payload=payload, points=[point_id], shard_key=placement.shard_key)
+                )
+                for point_id, payload in zip(point_ids, payloads)
+            ],
+            wait=False
+        )
+    
+    async def sync(self, brain_id: int):
+        """Consistency barrier for writes sent with ``wait=False``.
+        
+        Qdrant applies a shard's updates in order, so a waited no-op delete
+        (a filter that matches nothing) on every shard of the brain's
+        placement returns only after all earlier upserts are applied.
+        """
+        placement = await self.route(brain_id)
+        await self.client.delete(
+            collection_name=placement.collection_name,
+            points_selector=Filter(
+                must=[
+                    FieldCondition(key="brain_id", match=MatchValue(value=brain_id)),
+                    FieldCondition(key="document_id", match=MatchValue(value=-1))
+                ]
+            ),
+            wait=True,
+            shard_key_selector=placement.shard_key
+        )
+    
+    async def count(self, brain_id: int) -> int:
+        placement = await self.route(brain_id)
+        result = await self.client.count(
+            collection_name=placement.collection_name,
+            count_filter=self._match("brain_id", brain_id),
+            exact=True,
+            shard_key_selector=placement.shard_key
+        )
+        return result.count
+    
+    async def search(
         self,
         query_vector: List[float],
         brain_id: int,
         limit: int = 10,
-        score_threshold: float = 0.7
+        score_threshold: float = 0.7,
+        brain_settings: Optional[Dict[str, Any]] = None,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
     ) -> List[Dict[str, Any]]:
-        """Search for similar vectors."""
-        search_result = self.client.search(
-            collection_name=self.collection_name,
+        """Search for similar vectors.
+        
+        On quantized collections the quantized index is oversampled and the
+        candidates rescored with the original vectors (see search_params_for).
+        The payload projection is applied by Qdrant, so excluded fields are
+        never read from disk or sent over the wire.
+        """
+        placement = await self.route(brain_id)
+        search_result = await self.client.search(
+            collection_name=placement.collection_name,
             query_vector=query_vector,
-            query_filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="brain_id",
-                        match=MatchValue(value=brain_id)
-                    )
-                ]
-            ),
+            query_filter=self._match("brain_id", brain_id),
+            search_params=search_params_for(brain_settings),
             limit=limit,
-            score_threshold=score_threshold
+            score_threshold=score_threshold,
+            with_payload=payload_selector(payload_fields, exclude_fields),
+            with_vectors=with_vectors,
+            shard_key_selector=placement.shard_key,
+            timeout=self.search_timeout
         )
         
         results = []
         for scored_point in search_result:
-            results.append({
+            result = {
                 "id": scored_point.id,
                 "score": scored_point.score,
-                "payload": scored_point.payload
-            })
+                "payload": scored_point.payload or {}
+            }
+            if with_vectors:
+                result["vector"] = scored_point.vector
+            results.append(result)
         
         return results
     
-    def delete_by_document(self, document_id: int):
-        """Delete all vectors for a document."""
-        self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=Filter(
+    async def search_many(
+        self,
+        query_vector: List[float],
+        brain_ids: List[int],
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search several brains with one query per collection.
+        
+        Brains are grouped by their routed collection and each group is
+        searched once with a MatchAny filter on brain_id (and all of the
+        group's shard keys), so brains sharing a placement cost a single
+        round trip. Group results are merged by score.
+        """
+        placements = await asyncio.gather(*(self.route(brain_id) for brain_id in brain_ids))
+        groups: Dict[str, Tuple[List[int], List[Any]]] = {}
+        for brain_id, placement in zip(brain_ids, placements):
+            group_brains, shard_keys = groups.setdefault(placement.collection_name, ([], []))
+            group_brains.append(brain_id)
+            if placement.shard_key is not None and placement.shard_key not in shard_keys:
+                shard_keys.append(placement.shard_key)
+        
+        async def search_group(collection_name: str, group_brains: List[int], shard_keys: List[Any]):
+            return await self.client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=Filter(
+                    must=[FieldCondition(key="brain_id", match=MatchAny(any=group_brains))]
+                ),
+                limit=limit,
+                score_threshold=score_threshold,
+                with_payload=payload_selector(payload_fields, exclude_fields),
+                shard_key_selector=shard_keys or None,
+                timeout=self.search_timeout
+            )
+        
+        group_results = await asyncio.gather(*(
+            search_group(collection_name, group_brains, shard_keys)
+            for collection_name, (group_brains, shard_keys) in groups.items()
+        ))
+        return merge_results(
+            [
+                [
+                    {"id": point.id, "score": point.score, "payload": point.payload or {}}
+                    for point in points
+                ]
+                for points in group_results
+            ],
+            limit
+        )
+    
+    async def score_points(self, query_vector: List[float], brain_id: int, point_ids: List[str]) -> Dict[str, float]:
+        """Cosine similarity of the query to specific points of a brain.
+        
+        An exact search restricted to the point IDs, scored on the original
+        vectors even in quantized collections.
+        """
+        if not point_ids:
+            return {}
+        placement = await self.route(brain_id)
+        points = await self.client.search(
+            collection_name=placement.collection_name,
+            query_vector=query_vector,
+            query_filter=Filter(
                 must=[
-                    FieldCondition(
-                        key="document_id",
-                        match=MatchValue(value=document_id)
-                    )
+                    FieldCondition(key="brain_id", match=MatchValue(value=brain_id)),
+                    HasIdCondition(has_id=point_ids)
                 ]
+            ),
+            search_params=SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True)),
+            limit=len(point_ids),
+            with_payload=False,
+            shard_key_selector=placement.shard_key,
+            timeout=self.search_timeout
+        )
+        return {str(point.id): point.score for point in points}
+    
+    async def get_chunk_hashes(self, brain_id: int, document_id: int) -> Dict[str, List[str]]:
+        """Map chunk content hash to point IDs for a document's stored vectors."""
+        placement = await self.route(brain_id)
+        hashes: Dict[str, List[str]] = {}
+        offset = None
+        
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=placement.collection_name,
+                scroll_filter=self._match("document_id", document_id),
+                limit=1000,
+                offset=offset,
+                with_payload=["chunk_hash"],
+                with_vectors=False,
+                shard_key_selector=placement.shard_key
             )
+            
+            for point in points:
+                chunk_hash = (point.payload or {}).get("chunk_hash", "")
+                hashes.setdefault(chunk_hash, []).append(str(point.id))
+            
+            if offset is None:
+                break
+        
+        return hashes
+    
+    async def delete_points(self, brain_id: int, point_ids: List[str]):
+        """Delete a brain's vectors by point ID."""
+        if not point_ids:
+            return
+        placement = await self.route(brain_id)
+        await self.client.delete(
+            collection_name=placement.collection_name,
+            points_selector=PointIdsList(points=point_ids),
+            shard_key_selector=placement.shard_key
+        )
+    
+    async def delete_by_document(self, brain_id: int, document_id: int):
+        """Delete all vectors for a document."""
+        placement = await self.route(brain_id)
+        await self.client.delete(
+            collection_name=placement.collection_name,
+            points_selector=self._match("document_id", document_id),
+            shard_key_selector=placement.shard_key
         )
     
-    def delete_by_brain(self, brain_id: int):
+    async def delete_by_brain(self, brain_id: int):
         """Delete all vectors for a brain."""
-        self.client.delete(
-            collection_name=self.collection_name,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="brain_id",
-                        match=MatchValue(value=brain_id)
-                    )
-                ]
+        placement = await self.route(brain_id)
+        await self.client.delete(
+            collection_name=placement.collection_name,
+            points_selector=self._match("brain_id", brain_id),
+            shard_key_selector=placement.shard_key
+        )
+        self.invalidate_route(brain_id)
+    
+    async def move_brain(self, brain_id: int, source: Placement, target: Placement, batch_size: int = 256) -> int:
+        """Copy a brain's points from one placement to another.
+        
+        Source points are left in place; call delete_brain_points once every
+        process has picked up the new route. Returns the number of points copied.
+        """
+        await self._ensure_placement(source)
+        await self._ensure_placement(target)
+        copied = 0
+        offset = None
+        
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=source.collection_name,
+                scroll_filter=self._match("brain_id", brain_id),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+                shard_key_selector=source.shard_key
             )
+            
+            if points:
+                await self.client.upsert(
+                    collection_name=target.collection_name,
+                    points=[
+                        PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                        for point in points
+                    ],
+                    shard_key_selector=target.shard_key
+                )
+                copied += len(points)
+            
+            if offset is None:
+                break
+        
+        return copied
+    
+    async def delete_brain_points(self, brain_id: int, placement: Placement):
+        """Delete a brain's points from a specific placement."""
+        await self._ensure_placement(placement)
+        await self.client.delete(
+            collection_name=placement.collection_name,
+            points_selector=self._match("brain_id", brain_id),
+            shard_key_selector=placement.shard_key
         )
 
 
+BACKEND_QDRANT = "qdrant"
+BACKEND_LOCAL = "local"
+
+# First key of the per-brain advisory lock taken around local index writes
+LOCAL_WRITE_LOCK_KEY = 15001
+
+
+class VectorStore:
+    """Routes each brain's vector operations to its backend.
+    
+    With VECTOR_LOCAL_MAX_VECTORS > 0, new brains start on the in-process
+    LocalVectorIndex and are promoted to Qdrant once they outgrow it.
+    Brains created before backends existed stay on Qdrant. The backend is
+    recorded on Brain.vector_backend and cached in process alongside the
+    Qdrant placement. Local writes (adds, payload updates and deletes) and
+    promotion are serialized per brain by a Postgres advisory lock, so
+    every process agrees on the backend. VECTOR_LOCAL_DIR must be shared
+    by every API and worker process.
+    """
+    
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.qdrant = QdrantBackend(session_factory)
+        self.local = LocalVectorIndex(settings.VECTOR_LOCAL_DIR, settings.VECTOR_LOCAL_CACHE_BRAINS)
+        self.local_max_vectors = settings.VECTOR_LOCAL_MAX_VECTORS
+        # brain_id -> (backend name, cached_at)
+        self._backends: Dict[int, Tuple[str, float]] = {}
+    
+    def use_session_factory(self, session_factory: async_sessionmaker):
+        """Read and update brain routes through another session factory."""
+        self.session_factory = session_factory
+        self.qdrant.session_factory = session_factory
+    
+    def backend_for_new_brain(self) -> str:
+        return BACKEND_LOCAL if self.local_max_vectors > 0 else BACKEND_QDRANT
+    
+    def invalidate_route(self, brain_id: int):
+        self._backends.pop(brain_id, None)
+        self.qdrant.invalidate_route(brain_id)
+    
+    def prime_routes(self, brains: List[Brain]):
+        """Cache routes from already-loaded Brain rows, skipping per-brain lookups."""
+        now = time.monotonic()
+        for brain in brains:
+            name = brain.vector_backend or BACKEND_QDRANT
+            if name == BACKEND_QDRANT:
+                self.qdrant.set_route(brain.id, Placement(
+                    brain.vector_collection or self.qdrant.collection_name,
+                    brain.vector_shard_key
+                ))
+            self._backends[brain.id] = (name, now)
+    
+    async def _read_route(self, db: AsyncSession, brain_id: int) -> VectorBackend:
+        """Load a brain's backend (and Qdrant placement) from the database and cache it."""
+        result = await db.execute(
+            select(Brain.vector_backend, Brain.vector_collection, Brain.vector_shard_key)
+            .where(Brain.id == brain_id)
+        )
+        row = result.one_or_none()
+        
+        name = (row.vector_backend if row is not None else None) or BACKEND_QDRANT
+        if name == BACKEND_QDRANT and row is not None:
+            # Prime the Qdrant route from the same lookup
+            self.qdrant.set_route(brain_id, Placement(
+                row.vector_collection or self.qdrant.collection_name,
+                row.vector_shard_key
+            ))
+        
+        self._backends[brain_id] = (name, time.monotonic())
+        return self.local if name == BACKEND_LOCAL else self.qdrant
+    
+    async def backend(self, brain_id: int) -> VectorBackend:
+        """Resolve the backend for a brain, loading its route on a cache miss."""
+        cached = self._backends.get(brain_id)
+        if cached is not None and time.monotonic() - cached[1] < self.qdrant.route_ttl:
+            return self.local if cached[0] == BACKEND_LOCAL else self.qdrant
+        
+        async with self.session_factory() as db:
+            return await self._read_route(db, brain_id)
+    
+    async def _backend_checked(self, brain_id: int) -> VectorBackend:
+        """Resolve a brain's backend, re-reading the route if a local index has moved."""
+        backend = await self.backend(brain_id)
+        if backend is self.local and not self.local.exists(brain_id) and brain_id in self._backends:
+            # Possibly promoted by another process since we cached the route
+            self.invalidate_route(brain_id)
+            backend = await self.backend(brain_id)
+        return backend
+    
+    @staticmethod
+    async def _lock_brain(db: AsyncSession, brain_id: int):
+        """Lock a brain's local index writes across processes until db's transaction ends."""
+        await db.execute(select(func.pg_advisory_xact_lock(LOCAL_WRITE_LOCK_KEY, brain_id)))
+    
+    async def _copy_to_qdrant(self, db: AsyncSession, brain_id: int):
+        """Copy a local brain to Qdrant and switch its backend in db's transaction.
+        
+        The caller holds the brain lock, commits, and then deletes the local index.
+        """
+        for point_ids, vectors, payloads in self.local.iter_points(brain_id):
+            await self.qdrant.upsert_points(brain_id, point_ids, vectors.tolist(), payloads)
+        await db.execute(update(Brain).where(Brain.id == brain_id).values(vector_backend=BACKEND_QDRANT))
+    
+    async def _finish_promotion(self, brain_id: int):
+        self._backends[brain_id] = (BACKEND_QDRANT, time.monotonic())
+        await self.local.delete_by_brain(brain_id)
+    
+    async def promote(self, brain_id: int):
+        """Move a brain from the local index to Qdrant."""
+        async with self.session_factory() as db:
+            await self._lock_brain(db, brain_id)
+            promoted = await self._read_route(db, brain_id) is self.local
+            if promoted:
+                await self._copy_to_qdrant(db, brain_id)
+            await db.commit()
+        
+        if promoted:
+            await self._finish_promotion(brain_id)
+    
+    async def add_vectors(
+        self,
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        brain_id: int,
+        document_id: int,
+        point_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Add vectors, promoting the brain to Qdrant if it outgrows the local index.
+        
+        Writes to a local brain hold the brain lock from the size check to
+        the write, and re-read the brain's backend under it, so a brain
+        promoted by another process is never written locally again and the
+        size limit holds across processes.
+        """
+        backend = await self.backend(brain_id)
+        if backend is not self.local:
+            return await backend.add_vectors(vectors, payloads, brain_id, document_id, point_ids)
+        
+        promoted = False
+        async with self.session_factory() as db:
+            await self._lock_brain(db, brain_id)
+            backend = await self._read_route(db, brain_id)
+            if backend is self.local and await self.local.count(brain_id) + len(vectors) > self.local_max_vectors:
+                await self._copy_to_qdrant(db, brain_id)
+                backend = self.qdrant
+                promoted = True
+            vector_ids = await backend.add_vectors(vectors, payloads, brain_id, document_id, point_ids)
+            await db.commit()
+        
+        if promoted:
+            await self._finish_promotion(brain_id)
+        return vector_ids
+    
+    async def _write(self, brain_id: int, write: Callable[[VectorBackend], Awaitable[Any]]) -> Any:
+        """Run a write on the brain's backend, under the brain lock if it is local.
+        
+        The backend is re-read under the lock, so a write racing a promotion
+        lands on Qdrant once the brain has moved instead of on a local index
+        that is about to be deleted.
+        """
+        backend = await self.backend(brain_id)
+        if backend is not self.local:
+            return await write(backend)
+        
+        async with self.session_factory() as db:
+            await self._lock_brain(db, brain_id)
+            backend = await self._read_route(db, brain_id)
+            result = await write(backend)
+            await db.commit()
+        return result
+    
+    async def sync(self, brain_id: int):
+        """Wait until the brain's pending writes are applied."""
+        backend = await self._backend_checked(brain_id)
+        await backend.sync(brain_id)
+    
+    async def search(
+        self,
+        query_vector: List[float],
+        brain_id: int,
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        brain_settings: Optional[Dict[str, Any]] = None,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Search for similar vectors."""
+        backend = await self._backend_checked(brain_id)
+        return await backend.search(
+            query_vector, brain_id, limit, score_threshold, brain_settings,
+            payload_fields, exclude_fields, with_vectors
+        )
+    
+    async def search_many(
+        self,
+        query_vector: List[float],
+        brain_ids: List[int],
+        limit: int = 10,
+        score_threshold: float = 0.7,
+        payload_fields: Optional[List[str]] = None,
+        exclude_fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search several brains, which may live on different backends, in one call."""
+        backends = await asyncio.gather(*(self._backend_checked(brain_id) for brain_id in brain_ids))
+        qdrant_brains = [brain_id for brain_id, backend in zip(brain_ids, backends) if backend is self.qdrant]
+        local_brains = [brain_id for brain_id, backend in zip(brain_ids, backends) if backend is self.local]
+        
+        searches = []
+        for backend, group in ((self.qdrant, qdrant_brains), (self.local, local_brains)):
+            if group:
+                searches.append(backend.search_many(
+                    query_vector, group, limit, score_threshold, payload_fields, exclude_fields
+                ))
+        return merge_results(await asyncio.gather(*searches), limit)
+    
+    async def set_payloads(self, brain_id: int, point_ids: List[str], payloads: List[Dict[str, Any]]):
+        await self._write(brain_id, lambda backend: backend.set_payloads(brain_id, point_ids, payloads))
+    
+    async def score_points(self, query_vector: List[float], brain_id: int, point_ids: List[str]) -> Dict[str, float]:
+        backend = await self._backend_checked(brain_id)
+        return await backend.score_points(query_vector, brain_id, point_ids)
+    
+    async def get_chunk_hashes(self, brain_id: int, document_id: int) -> Dict[str, List[str]]:
+        backend = await self._backend_checked(brain_id)
+        return await backend.get_chunk_hashes(brain_id, document_id)
+    
+    async def delete_points(self, brain_id: int, point_ids: List[str]):
+        await self._write(brain_id, lambda backend: backend.delete_points(brain_id, point_ids))
+    
+    async def delete_by_document(self, brain_id: int, document_id: int):
+        """Delete all vectors for a document."""
+        await self._write(brain_id, lambda backend: backend.delete_by_document(brain_id, document_id))
+    
+    async def delete_by_brain(self, brain_id: int):
+        """Delete all vectors for a brain."""
+        await self._write(brain_id, lambda backend: backend.delete_by_brain(brain_id))
+        self.invalidate_route(brain_id)
+
+
 # Global instance
 vector_store = VectorStore()
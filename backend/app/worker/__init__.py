@@ -0,0 +1 @@
+# Worker package
@@ -0,0 +1,22 @@
+from celery import Celery
+from app.core.config import settings
+
+celery_app = Celery(
+    "aura",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.worker.tasks"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    # Ack after the task finishes so a killed worker's job is redelivered
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    worker_concurrency=settings.INGESTION_WORKER_CONCURRENCY,
+    task_default_queue="ingestion",
+    broker_transport_options={"visibility_timeout": settings.INGESTION_VISIBILITY_TIMEOUT},
+)
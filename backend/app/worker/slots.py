@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from typing import List, Tuple
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionSlots:
+    """Redis-backed leases limiting concurrent ingestion jobs per owner.
+    
+    Owners are organizations or single documents. Each running job holds a
+    lease in a sorted set scored by its expiry, under a token unique to
+    that run, so a redelivered copy of a task never shares its lease.
+    Leases are renewed while the job runs (see LeaseHeartbeat); expired
+    ones are pruned on every acquire, so a slot held by a killed worker
+    frees itself ``ttl`` seconds after its last renewal.
+    """
+    
+    # Prune expired leases, then take a lease if a slot is free and the token holds none
+    ACQUIRE_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    if redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+        return 0
+    end
+    if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[4]) then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[5])
+        return 1
+    end
+    return 0
+    """
+    
+    # Extend a lease the token still holds
+    RENEW_SCRIPT = """
+    local expires = redis.call('ZSCORE', KEYS[1], ARGV[3])
+    if expires and tonumber(expires) > tonumber(ARGV[1]) then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return 1
+    end
+    return 0
+    """
+    
+    def __init__(self, name: str, limit: int, ttl: int, client: redis.Redis):
+        self.name = name
+        self.limit = limit
+        self.ttl = ttl
+        self.client = client
+        self._acquire = client.register_script(self.ACQUIRE_SCRIPT)
+        self._renew = client.register_script(self.RENEW_SCRIPT)
+    
+    def _key(self, owner_id: int) -> str:
+        return f"ingestion:{self.name}:{owner_id}:leases"
+    
+    def acquire(self, owner_id: int, token: str) -> bool:
+        """Take a slot for the owner, returning False if none are free."""
+        if self.limit <= 0:
+            return True
+        
+        now = time.time()
+        return bool(self._acquire(
+            keys=[self._key(owner_id)],
+            args=[now, now + self.ttl, token, self.limit, self.ttl]
+        ))
+    
+    def renew(self, owner_id: int, token: str) -> bool:
+        """Extend the token's lease, returning False if it has expired or was released."""
+        if self.limit <= 0:
+            return True
+        
+        now = time.time()
+        return bool(self._renew(
+            keys=[self._key(owner_id)],
+            args=[now, now + self.ttl, token, self.ttl]
+        ))
+    
+    def release(self, owner_id: int, token: str):
+        if self.limit <= 0:
+            return
+        self.client.zrem(self._key(owner_id), token)
+
+
+class LeaseHeartbeat:
+    """Renew leases from a background thread while a job runs.
+    
+    Used as a context manager around the job. The job runs the worker's
+    event loop on the calling thread, so renewals go through a thread of
+    their own.
+    """
+    
+    def __init__(self, leases: List[Tuple[IngestionSlots, int, str]], interval: float):
+        self.leases = leases
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            for slots, owner_id, token in self.leases:
+                try:
+                    if not slots.renew(owner_id, token):
+                        logger.warning("Lost %s lease for %s", slots.name, owner_id)
+                except redis.RedisError as e:
+                    logger.warning("Could not renew %s lease for %s: %s", slots.name, owner_id, e)
+    
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import multiprocessing
+import random
+import uuid
+from datetime import datetime
+from typing import Optional
+import billiard.process
+import redis
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.db.session import WorkerSessionLocal
+from app.models.models import Brain, Document, DocumentStatus
+from app.services.document_processor import document_processor
+from app.services.extraction import extraction_pool
+from app.services.vector_store import vector_store
+from app.services.lexical_index import lexical_index
+from app.services.answer_cache import brain_versions
+from app.worker.celery_app import celery_app
+from app.worker.slots import IngestionSlots, LeaseHeartbeat
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_async(coro):
+    """Run a coroutine on this worker process's long-lived event loop."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+@worker_init.connect
+def use_worker_sessions(**kwargs):
+    """Keep the vector store's route lookups in the worker's bounded pool.
+    
+    Runs in the worker's main process before pool children are forked, so
+    every child inherits the setting.
+    """
+    vector_store.use_session_factory(WorkerSessionLocal)
+
+
+@worker_process_init.connect
+def allow_extraction_processes(**kwargs):
+    """Let prefork pool children start the extraction process pool.
+    
+    Celery's pool children are daemonic, and daemonic processes may not
+    start children, so ProcessPoolExecutor would refuse to start and
+    extraction would fall back to a thread. The child shuts the pool down
+    when it exits (see stop_extraction_pool).
+    """
+    for process in (multiprocessing.current_process(), billiard.process.current_process()):
+        process._config["daemon"] = False
+
+
+@worker_process_shutdown.connect
+def stop_extraction_pool(**kwargs):
+    extraction_pool.shutdown()
+
+
+# Connects lazily, so pool children open their own connections
+slots_client = redis.Redis.from_url(settings.REDIS_URL)
+org_slots = IngestionSlots(
+    "org",
+    limit=settings.INGESTION_MAX_CONCURRENCY_PER_ORG,
+    ttl=settings.INGESTION_LEASE_TTL,
+    client=slots_client
+)
+document_slots = IngestionSlots("document", limit=1, ttl=settings.INGESTION_LEASE_TTL, client=slots_client)
+
+
+class RetryableIngestionError(Exception):
+    """Raised when a document failed but has attempts left."""
+    
+    def __init__(self, message: str, attempts: int):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for a failed attempt."""
+    delay = settings.INGESTION_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.INGESTION_RETRY_BACKOFF_MAX)
+    return delay + random.uniform(0, delay / 2)
+
+
+class SupersededError(Exception):
+    """Raised when a newer upload replaced the document being processed."""
+
+
+async def process_document_background(document_id: int, task_id: str) -> Optional[str]:
+    """Process a document and record its status.
+    
+    The file, type and brain are read from the document row. Only the
+    task recorded as the document's ``task_id`` may process it: a task
+    left over from a replaced version exits without touching the row, and
+    one that is replaced or deleted while running stops at its next
+    progress update. A task that finds its document deleted removes the
+    points it stored; a replaced document keeps them, since the new
+    version's task reuses unchanged chunks and deletes the rest.
+    
+    Returns the final document status, or None if the document no longer
+    exists or was superseded. Raises RetryableIngestionError if the
+    attempt failed but the document has attempts left.
+    """
+    async with WorkerSessionLocal() as db:
+        result = await db.execute(select(Document).where(Document.id == document_id))
+        document = result.scalar_one_or_none()
+        
+        if not document or document.task_id != task_id:
+            return None
+        
+        brain_id = document.brain_id
+        result = await db.execute(select(Brain.settings).where(Brain.id == brain_id))
+        brain_settings = result.scalar_one_or_none() or {}
+        
+        async def save(**values) -> bool:
+            """Update the document unless a newer upload has replaced it."""
+            result = await db.execute(
+                update(Document)
+                .where(Document.id == document_id, Document.task_id == task_id)
+                .values(**values)
+            )
+            await db.commit()
+            return result.rowcount > 0
+        
+        async def discard_if_deleted():
+            """Delete this document's points if the document was deleted meanwhile."""
+            result = await db.execute(select(Document.id).where(Document.id == document_id))
+            if result.scalar_one_or_none() is None:
+                await vector_store.delete_by_document(brain_id, document_id)
+                await lexical_index.delete_by_document(brain_id, document_id)
+        
+        attempts = (document.processing_attempts or 0) + 1
+        if not await save(
+            status=DocumentStatus.PROCESSING.value,
+            processing_attempts=attempts,
+            processing_started_at=datetime.utcnow()
+        ):
+            await discard_if_deleted()
+            return None
+        
+        async def record_progress(chunks_indexed: int):
+            metadata = {**(document.doc_metadata or {}), "chunks_indexed": chunks_indexed}
+            if not await save(doc_metadata=metadata):
+                raise SupersededError(f"Document {document_id} was replaced or deleted")
+        
+        try:
+            # Process document
+            vector_ids = await document_processor.process_document(
+                file_path=document.file_path,
+                file_type=document.file_type,
+                brain_id=brain_id,
+                document_id=document_id,
+                metadata={
+                    "filename": document.original_filename,
+                    "source": document.source
+                },
+                on_progress=record_progress,
+                brain_settings=brain_settings
+            )
+            
+            # Update document
+            completed = await save(
+                vector_ids=vector_ids,
+                is_processed=True,
+                status=DocumentStatus.COMPLETED.value,
+                processing_error=None
+            )
+            if not completed:
+                await discard_if_deleted()
+            # Cached answers for the brain no longer reflect its documents
+            await brain_versions.bump(brain_id)
+            return DocumentStatus.COMPLETED.value if completed else None
+        except SupersededError:
+            await db.rollback()
+            await discard_if_deleted()
+            await brain_versions.bump(brain_id)
+            return None
+        except Exception as e:
+            await db.rollback()
+            # Chunks indexed before the failure are already searchable
+            await brain_versions.bump(brain_id)
+            
+            if attempts >= settings.INGESTION_MAX_ATTEMPTS:
+                if not await save(status=DocumentStatus.FAILED.value, processing_error=str(e)):
+                    await discard_if_deleted()
+                    return None
+                return DocumentStatus.FAILED.value
+            
+            if not await save(status=DocumentStatus.RETRYING.value, processing_error=str(e)):
+                await discard_if_deleted()
+                return None
+            raise RetryableIngestionError(str(e), attempts) from e
+
+
+@celery_app.task(bind=True, name="ingestion.process_document", max_retries=None)
+def process_document_task(self, document_id: int, organization_id: int):
+    """Ingest an uploaded document in a worker process.
+    
+    Only the document ID is sent; the file to process is read from the
+    document row, so retries of a replaced version cannot process its
+    deleted file. One task at a time holds a document's lease, so a new
+    version waits for a replaced in-flight task to stop. Leases are taken
+    under a token unique to this run and renewed while it processes.
+    """
+    token = uuid.uuid4().hex
+    if not org_slots.acquire(organization_id, token):
+        # Organization is at its concurrency limit; try again shortly
+        raise self.retry(countdown=settings.INGESTION_ORG_WAIT_SECONDS)
+    
+    try:
+        if not document_slots.acquire(document_id, token):
+            raise self.retry(countdown=settings.INGESTION_ORG_WAIT_SECONDS)
+        try:
+            leases = [(org_slots, organization_id, token), (document_slots, document_id, token)]
+            with LeaseHeartbeat(leases, interval=settings.INGESTION_LEASE_TTL / 3):
+                run_async(process_document_background(document_id, self.request.id))
+        finally:
+            document_slots.release(document_id, token)
+    except RetryableIngestionError as e:
+        logger.warning("Ingestion of document %s failed (attempt %s): %s", document_id, e.attempts, e)
+        raise self.retry(exc=e, countdown=retry_delay(e.attempts))
+    finally:
+        org_slots.release(organization_id, token)
@@ -0,0 +1,110 @@
+"""Benchmark: loading chat history for a 10k-message session.
+
+Creates a session with many messages, then times the two ways of
+getting the recent history: loading the whole session with
+selectinload(ChatSession.messages) and slicing in Python (the old /chat
+behaviour), and the indexed tail query in load_recent_messages. The
+tail query's plan is printed so the (session_id, created_at) index can
+be confirmed. The session is deleted afterwards unless --keep is given.
+
+Usage:
+    python -m benchmarks.chat_history --user-id 1 --brain-id 1 --messages 10000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.orm import selectinload
+from app.db.session import AsyncSessionLocal
+from app.models.models import ChatSession, ChatMessage
+from app.services.chat_history import load_recent_messages
+
+
+async def create_session(args) -> int:
+    async with AsyncSessionLocal() as db:
+        session = ChatSession(user_id=args.user_id, brain_id=args.brain_id, title="History benchmark")
+        db.add(session)
+        await db.flush()
+        
+        started = datetime.utcnow() - timedelta(seconds=args.messages)
+        for offset in range(0, args.messages, 1000):
+            await db.execute(insert(ChatMessage), [
+                {
+                    "session_id": session.id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"Benchmark message {i}. " * 20,
+                    "sources": [],
+                    "msg_metadata": {},
+                    "created_at": started + timedelta(seconds=i)
+                }
+                for i in range(offset, min(offset + 1000, args.messages))
+            ])
+        await db.commit()
+        return session.id
+
+
+async def load_full(session_id: int, limit: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatSession).options(selectinload(ChatSession.messages)).where(ChatSession.id == session_id)
+        )
+        session = result.scalar_one()
+        return [{"role": msg.role, "content": msg.content} for msg in session.messages[-limit:]]
+
+
+async def load_tail(session_id: int, limit: int):
+    async with AsyncSessionLocal() as db:
+        return await load_recent_messages(db, session_id, limit)
+
+
+async def measure(name: str, load, session_id: int, args):
+    latencies = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        history = await load(session_id, args.limit)
+        latencies.append(time.perf_counter() - started)
+    assert len(history) == min(args.limit, args.messages)
+    print(f"{name:12s} p50 {statistics.median(latencies) * 1000:9.2f} ms  "
+          f"max {max(latencies) * 1000:9.2f} ms")
+    return history
+
+
+async def explain(session_id: int, limit: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text(
+            "EXPLAIN ANALYZE SELECT role, content FROM chat_messages WHERE session_id = :session_id "
+            "ORDER BY created_at DESC, id DESC LIMIT :limit"
+        ), {"session_id": session_id, "limit": limit})
+        for (line,) in result:
+            print(f"  {line}")
+
+
+async def main(args):
+    started = time.perf_counter()
+    session_id = await create_session(args)
+    print(f"created session {session_id} with {args.messages} messages in {time.perf_counter() - started:.1f}s")
+    
+    try:
+        await measure("full load", load_full, session_id, args)
+        await measure("tail query", load_tail, session_id, args)
+        
+        print("tail query plan:")
+        await explain(session_id, args.limit)
+    finally:
+        if not args.keep:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+                await db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--brain-id", type=int, required=True)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=20, help="History messages to load")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark session")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""Benchmark: first-message /chat latency with deferred title generation.
+
+The first message of a session used to wait for a second LLM call that
+generated the session title. Each round sends a first message (new
+session) and then a follow-up in the same session; the follow-up never
+generates a title, so the latency gap between the two is what title
+generation costs on the critical path. With deferred titles the gap
+should be close to zero. The time until the generated title replaces
+the fallback is reported separately.
+
+Usage:
+    python -m benchmarks.chat_title_latency --token <JWT> --brain-id 1 --rounds 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+MESSAGES = [
+    "How do I reset my password?",
+    "What is the refund policy for annual plans?",
+    "Summarise the onboarding checklist for new engineers",
+    "Who approves travel expenses over the limit?",
+    "What does error code E1042 mean?",
+]
+
+
+async def wait_for_title(client: httpx.AsyncClient, session_id: int, fallback: str, timeout: float) -> float:
+    """Seconds until the session title differs from the fallback, or NaN on timeout."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        response = await client.get(f"/sessions/{session_id}")
+        response.raise_for_status()
+        if response.json()["title"] != fallback:
+            return time.perf_counter() - started
+        await asyncio.sleep(0.1)
+    return float("nan")
+
+
+async def main(args):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    first_latencies = []
+    followup_latencies = []
+    title_delays = []
+    
+    async with httpx.AsyncClient(base_url=args.api_url, headers=headers, timeout=120) as client:
+        for i in range(args.rounds):
+            message = MESSAGES[i % len(MESSAGES)]
+            
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"message": message, "brain_id": args.brain_id})
+            response.raise_for_status()
+            first_latencies.append(time.perf_counter() - started)
+            session_id = response.json()["session_id"]
+            
+            session = (await client.get(f"/sessions/{session_id}")).json()
+            title_delays.append(await wait_for_title(client, session_id, session["title"], args.title_timeout))
+            
+            started = time.perf_counter()
+            response = await client.post("/chat", json={
+                "message": message,
+                "brain_id": args.brain_id,
+                "session_id": session_id
+            })
+            response.raise_for_status()
+            followup_latencies.append(time.perf_counter() - started)
+            
+            if not args.keep_sessions:
+                await client.delete(f"/sessions/{session_id}")
+    
+    first = statistics.median(first_latencies) * 1000
+    followup = statistics.median(followup_latencies) * 1000
+    delays = [d for d in title_delays if d == d]
+    print(f"first message  p50 {first:8.1f} ms")
+    print(f"follow-up      p50 {followup:8.1f} ms")
+    print(f"title overhead p50 {first - followup:8.1f} ms (first - follow-up)")
+    if delays:
+        print(f"generated title ready after p50 {statistics.median(delays) * 1000:.1f} ms "
+              f"({len(delays)}/{len(title_delays)} sessions)")
+    else:
+        print("title never changed after the first response (generated inline, or generation failing)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--brain-id", type=int, required=True)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--title-timeout", type=float, default=30.0)
+    parser.add_argument("--keep-sessions", action="store_true", help="Do not delete the benchmark sessions")
+    asyncio.run(main(parser.parse_args()))
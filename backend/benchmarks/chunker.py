@@ -0,0 +1,86 @@
+"""Benchmark: token-aware chunker vs the legacy character chunker.
+
+Generates MB-scale synthetic text and reports throughput and chunk
+statistics for both implementations.
+
+Usage:
+    python -m benchmarks.chunker --megabytes 1 2 5
+"""
+import argparse
+import random
+import time
+from app.services.chunker import TokenChunker
+from app.services.tokenizer import count_tokens
+from app.core.config import settings
+
+WORDS = (
+    "the retrieval system indexes documents into chunks and embeds each chunk "
+    "error code E1042 SKU-88317 invoice quarterly revenue onboarding policy "
+    "customer support escalation latency throughput vector database"
+).split()
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200):
+    """The previous character-based DocumentProcessor.chunk_text."""
+    chunks = []
+    start = 0
+    
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        
+        if end < len(text):
+            last_period = chunk.rfind('.')
+            last_newline = chunk.rfind('\n')
+            last_space = chunk.rfind(' ')
+            
+            break_point = max(last_period, last_newline, last_space)
+            if break_point > 0:
+                chunk = chunk[:break_point + 1]
+                end = start + len(chunk)
+        
+        chunks.append(chunk.strip())
+        start = end - overlap
+    
+    return chunks
+
+
+def make_text(size_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))).capitalize() + ". "
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)
+
+
+def run(name: str, fn, text: str):
+    started = time.perf_counter()
+    chunks = fn(text)
+    elapsed = time.perf_counter() - started
+    sample = chunks[: min(len(chunks), 200)]
+    max_tokens = max(count_tokens(chunk, settings.EMBEDDING_MODEL) for chunk in sample)
+    mb = len(text) / 1_000_000
+    print(f"  {name:<8} {elapsed:8.3f}s  {mb / elapsed:7.2f} MB/s  "
+          f"{len(chunks):7d} chunks  max tokens (sample) {max_tokens}")
+
+
+def main(args):
+    chunker = TokenChunker(args.chunk_tokens, args.overlap_tokens)
+    for megabytes in args.megabytes:
+        text = make_text(int(megabytes * 1_000_000))
+        print(f"{megabytes} MB")
+        run("legacy", legacy_chunk_text, text)
+        run("token", chunker.chunk, text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--chunk-tokens", type=int, default=settings.CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=settings.CHUNK_OVERLAP_TOKENS)
+    main(parser.parse_args())
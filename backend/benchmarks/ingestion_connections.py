@@ -0,0 +1,85 @@
+"""Benchmark: database connections during a bulk upload.
+
+Uploads many small text documents through the API while sampling
+pg_stat_activity, then waits for the ingestion queue to drain. With the
+shared worker engine the connection count should stay flat instead of
+growing with the number of documents.
+
+Usage:
+    python -m benchmarks.ingestion_connections --token <JWT> --brain-id 1 --count 500
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from sqlalchemy import text
+from app.db.session import sync_engine
+
+
+def count_connections() -> int:
+    with sync_engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()"
+        )).scalar()
+
+
+async def sample_connections(samples: list, stop: asyncio.Event, interval: float):
+    while not stop.is_set():
+        samples.append(await asyncio.to_thread(count_connections))
+        await asyncio.sleep(interval)
+
+
+async def pending_documents(client: httpx.AsyncClient, brain_id: int) -> int:
+    response = await client.get(f"/brains/{brain_id}/documents")
+    response.raise_for_status()
+    return sum(1 for doc in response.json() if doc["status"] not in ("completed", "failed"))
+
+
+async def main(args):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    samples = []
+    stop = asyncio.Event()
+    
+    async with httpx.AsyncClient(base_url=args.api_url, headers=headers, timeout=60) as client:
+        baseline = count_connections()
+        sampler = asyncio.create_task(sample_connections(samples, stop, args.interval))
+        started = time.perf_counter()
+        
+        semaphore = asyncio.Semaphore(args.concurrency)
+        
+        async def upload(i: int):
+            content = f"Benchmark document {i}.\n" * 200
+            async with semaphore:
+                response = await client.post(
+                    f"/brains/{args.brain_id}/documents",
+                    files={"file": (f"bench_{i}.txt", content.encode(), "text/plain")}
+                )
+                response.raise_for_status()
+        
+        await asyncio.gather(*(upload(i) for i in range(args.count)))
+        uploaded = time.perf_counter() - started
+        
+        while await pending_documents(client, args.brain_id) > 0:
+            await asyncio.sleep(1)
+        drained = time.perf_counter() - started
+        
+        stop.set()
+        await sampler
+    
+    print(f"documents:            {args.count}")
+    print(f"upload time:          {uploaded:.1f}s")
+    print(f"ingestion drained in: {drained:.1f}s")
+    print(f"connections baseline: {baseline}")
+    print(f"connections min/max:  {min(samples)}/{max(samples)}")
+    print(f"connections final:    {count_connections()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--brain-id", type=int, required=True)
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+"""Benchmark: recall vs latency of quantized search settings for a brain.
+
+Ground truth is an exact (brute-force, full precision) search. Each
+configuration (oversampling, rescore on/off, or ignoring quantization)
+is scored by recall@k against it, along with mean and p95 latency.
+
+Queries come from a fixed file (one query per line, embedded once) or,
+if none is given, from a seeded sample of the brain's stored vectors,
+so repeated runs compare the same query set.
+
+Usage:
+    python -m benchmarks.quantization_recall --brain-id 1 --queries queries.txt
+    python -m benchmarks.quantization_recall --brain-id 1 --sample 200 --oversampling 1 2 4
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from qdrant_client.models import QuantizationSearchParams, SearchParams
+from app.services.embeddings import embedding_service
+from app.services.vector_store import vector_store
+
+qdrant = vector_store.qdrant
+
+
+async def load_queries(args, placement):
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        return await embedding_service.create_embeddings_batched(texts)
+    
+    points, _ = await qdrant.client.scroll(
+        collection_name=placement.collection_name,
+        scroll_filter=qdrant._match("brain_id", args.brain_id),
+        limit=args.sample * 10,
+        with_payload=False,
+        with_vectors=True,
+        shard_key_selector=placement.shard_key
+    )
+    rng = random.Random(args.seed)
+    return [point.vector for point in rng.sample(points, min(args.sample, len(points)))]
+
+
+async def run_config(placement, queries, args, params: SearchParams):
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = await qdrant.client.search(
+            collection_name=placement.collection_name,
+            query_vector=query,
+            query_filter=qdrant._match("brain_id", args.brain_id),
+            search_params=params,
+            limit=args.k,
+            with_payload=False,
+            shard_key_selector=placement.shard_key
+        )
+        latencies.append(time.perf_counter() - started)
+        results.append([hit.id for hit in hits])
+    return results, latencies
+
+
+async def main(args):
+    placement = await qdrant.route(args.brain_id)
+    queries = await load_queries(args, placement)
+    if not queries:
+        print("No queries")
+        return
+    
+    truth, _ = await run_config(placement, queries, args, SearchParams(exact=True))
+    
+    configs = [("no quantization", SearchParams(quantization=QuantizationSearchParams(ignore=True)))]
+    for oversampling in args.oversampling:
+        for rescore in (True, False):
+            configs.append((
+                f"oversampling={oversampling} rescore={rescore}",
+                SearchParams(quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling))
+            ))
+    
+    print(f"{len(queries)} queries, k={args.k}, collection {placement.collection_name}")
+    for name, params in configs:
+        found, latencies = await run_config(placement, queries, args, params)
+        recall = statistics.mean(
+            len(set(f) & set(t)) / len(t) if t else 1.0
+            for f, t in zip(found, truth)
+        )
+        latencies.sort()
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        print(f"  {name:<36} recall@{args.k} {recall:.3f}  "
+              f"mean {statistics.mean(latencies) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--brain-id", type=int, required=True)
+    parser.add_argument("--queries", help="File with one query per line")
+    parser.add_argument("--sample", type=int, default=100, help="Stored vectors to use as queries if no file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""Load test: /search throughput at increasing concurrency.
+
+Sends a fixed number of /search requests at each concurrency level and
+reports requests/second and latency percentiles. With non-blocking
+vector store calls, throughput should keep rising with concurrency
+instead of flattening out.
+
+Usage:
+    python -m benchmarks.search_load --token <JWT> --brain-id 1 --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+QUERIES = [
+    "How do I reset my password?",
+    "What is the refund policy?",
+    "Error code E1042",
+    "Quarterly revenue summary",
+    "Who approves travel expenses?",
+]
+
+
+async def run_level(client: httpx.AsyncClient, args, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/search", json={
+                "query": QUERIES[i % len(QUERIES)],
+                "brain_id": args.brain_id,
+                "limit": args.limit
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"concurrency {concurrency:4d}: {args.requests / elapsed:8.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+
+
+async def main(args):
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.api_url, headers=headers, limits=limits, timeout=60) as client:
+        for concurrency in args.concurrency:
+            await run_level(client, args, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--brain-id", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    asyncio.run(main(parser.parse_args()))
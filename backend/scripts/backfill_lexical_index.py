@@ -0,0 +1,75 @@
+"""Build lexical (BM25) index entries for chunks already in the vector store.
+
+Ingestion only writes lexical entries for chunks it flushes, so brains
+indexed before hybrid search existed get no lexical results until their
+documents are re-processed. This copies every stored chunk's payload of
+the selected brains into the lexical index. Entries are replaced by point
+ID, so the script can be re-run safely.
+
+Usage:
+    python -m scripts.backfill_lexical_index
+    python -m scripts.backfill_lexical_index --organization-id 3
+    python -m scripts.backfill_lexical_index --brain-id 12 --dry-run
+"""
+import argparse
+import asyncio
+from sqlalchemy import select
+from app.db.session import AsyncSessionLocal
+from app.models.models import Brain
+from app.services.lexical_index import lexical_index, STORED_FIELDS
+from app.services.vector_store import vector_store
+
+qdrant = vector_store.qdrant
+
+
+async def iter_payloads(brain_id: int, batch_size: int):
+    """Yield (point_ids, payloads) batches of a brain's stored chunks."""
+    backend = await vector_store.backend(brain_id)
+    if backend is vector_store.local:
+        for point_ids, _, payloads in vector_store.local.iter_points(brain_id, batch_size):
+            yield point_ids, payloads
+        return
+    
+    placement = await qdrant.route(brain_id)
+    offset = None
+    while True:
+        points, offset = await qdrant.client.scroll(
+            collection_name=placement.collection_name,
+            scroll_filter=qdrant._match("brain_id", brain_id),
+            limit=batch_size,
+            offset=offset,
+            with_payload=STORED_FIELDS,
+            with_vectors=False,
+            shard_key_selector=placement.shard_key
+        )
+        if points:
+            yield [str(point.id) for point in points], [point.payload or {} for point in points]
+        if offset is None:
+            break
+
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        query = select(Brain.id).order_by(Brain.id)
+        if args.brain_id:
+            query = query.where(Brain.id.in_(args.brain_id))
+        if args.organization_id:
+            query = query.where(Brain.organization_id == args.organization_id)
+        brain_ids = (await db.execute(query)).scalars().all()
+    
+    for brain_id in brain_ids:
+        indexed = 0
+        async for point_ids, payloads in iter_payloads(brain_id, args.batch_size):
+            if not args.dry_run:
+                await lexical_index.add(brain_id, point_ids, payloads)
+            indexed += len(point_ids)
+        print(f"brain {brain_id}: {'would index' if args.dry_run else 'indexed'} {indexed} chunks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--brain-id", type=int, action="append")
+    parser.add_argument("--organization-id", type=int)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
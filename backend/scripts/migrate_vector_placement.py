@@ -0,0 +1,86 @@
+"""Move brains' vectors between placement strategies.
+
+For each selected brain whose current placement differs from the target
+strategy, points are copied to the target collection/shard key, the
+brain's routing entry is updated, and, once every process's route cache
+has expired, the source points are deleted.
+
+Writes to a brain while it is being moved may land in the old placement;
+run during a quiet window or pause ingestion for the affected brains.
+
+Usage:
+    python -m scripts.migrate_vector_placement --strategy organization
+    python -m scripts.migrate_vector_placement --strategy shard_key --organization-id 3
+    python -m scripts.migrate_vector_placement --strategy shared --brain-id 12 --dry-run
+"""
+import argparse
+import asyncio
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import Brain
+from app.services.vector_store import vector_store, Placement, PLACEMENT_STRATEGIES, BACKEND_LOCAL
+
+qdrant = vector_store.qdrant
+
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        query = select(Brain).order_by(Brain.id)
+        if args.brain_id:
+            query = query.where(Brain.id.in_(args.brain_id))
+        if args.organization_id:
+            query = query.where(Brain.organization_id == args.organization_id)
+        brains = (await db.execute(query)).scalars().all()
+        
+        moved = []
+        for brain in brains:
+            if brain.vector_backend == BACKEND_LOCAL:
+                # Local brains pick up their placement when promoted to Qdrant
+                brain.vector_collection, brain.vector_shard_key = qdrant.placement_for(
+                    brain.organization_id, args.strategy
+                )
+                if not args.dry_run:
+                    await db.commit()
+                continue
+            
+            source = Placement(brain.vector_collection or qdrant.collection_name, brain.vector_shard_key)
+            target = qdrant.placement_for(brain.organization_id, args.strategy)
+            
+            if source == target:
+                continue
+            
+            print(f"brain {brain.id}: {source} -> {target}")
+            if args.dry_run:
+                continue
+            
+            copied = await qdrant.move_brain(brain.id, source, target, batch_size=args.batch_size)
+            brain.vector_collection = target.collection_name
+            brain.vector_shard_key = target.shard_key
+            await db.commit()
+            qdrant.set_route(brain.id, target)
+            moved.append((brain.id, source))
+            print(f"  copied {copied} points")
+        
+        if not moved:
+            print("Nothing to move")
+            return
+        
+        if not args.no_wait:
+            print(f"Waiting {settings.QDRANT_ROUTE_CACHE_TTL}s for route caches to expire...")
+            await asyncio.sleep(settings.QDRANT_ROUTE_CACHE_TTL)
+        
+        for brain_id, source in moved:
+            await qdrant.delete_brain_points(brain_id, source)
+            print(f"brain {brain_id}: removed points from {source}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strategy", choices=PLACEMENT_STRATEGIES, required=True)
+    parser.add_argument("--brain-id", type=int, action="append")
+    parser.add_argument("--organization-id", type=int)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--no-wait", action="store_true", help="Delete source points without waiting for route caches")
+    asyncio.run(main(parser.parse_args()))
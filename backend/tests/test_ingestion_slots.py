@@ -0,0 +1,103 @@
+import time
+import fakeredis
+import pytest
+from app.worker import slots as slots_module
+from app.worker.slots import IngestionSlots, LeaseHeartbeat
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for lease expiry."""
+    now = [1000.0]
+    monkeypatch.setattr(slots_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_org_limit(client, clock):
+    org_slots = IngestionSlots("org", limit=2, ttl=60, client=client)
+    
+    assert org_slots.acquire(1, "a")
+    assert org_slots.acquire(1, "b")
+    assert not org_slots.acquire(1, "c")
+    # Limits are per organization
+    assert org_slots.acquire(2, "c")
+
+
+def test_release_frees_slot(client, clock):
+    org_slots = IngestionSlots("org", limit=1, ttl=60, client=client)
+    
+    assert org_slots.acquire(1, "a")
+    assert not org_slots.acquire(1, "b")
+    org_slots.release(1, "a")
+    assert org_slots.acquire(1, "b")
+
+
+def test_document_limit(client, clock):
+    document_slots = IngestionSlots("document", limit=1, ttl=60, client=client)
+    org_slots = IngestionSlots("org", limit=2, ttl=60, client=client)
+    
+    assert document_slots.acquire(7, "a")
+    assert not document_slots.acquire(7, "b")
+    assert document_slots.acquire(8, "b")
+    # Organization and document leases are counted separately
+    assert org_slots.acquire(7, "a")
+
+
+def test_same_token_cannot_acquire_twice(client, clock):
+    org_slots = IngestionSlots("org", limit=2, ttl=60, client=client)
+    
+    assert org_slots.acquire(1, "a")
+    assert not org_slots.acquire(1, "a")
+
+
+def test_expired_lease_is_pruned(client, clock):
+    document_slots = IngestionSlots("document", limit=1, ttl=60, client=client)
+    
+    assert document_slots.acquire(7, "a")
+    clock[0] += 61
+    assert document_slots.acquire(7, "b")
+    # The expired holder cannot renew the slot it lost
+    assert not document_slots.renew(7, "a")
+
+
+def test_renew_extends_lease(client, clock):
+    document_slots = IngestionSlots("document", limit=1, ttl=60, client=client)
+    
+    assert document_slots.acquire(7, "a")
+    clock[0] += 50
+    assert document_slots.renew(7, "a")
+    clock[0] += 50
+    assert not document_slots.acquire(7, "b")
+    
+    document_slots.release(7, "a")
+    assert not document_slots.renew(7, "a")
+
+
+def test_zero_limit_disables_slots(client, clock):
+    org_slots = IngestionSlots("org", limit=0, ttl=60, client=client)
+    
+    assert org_slots.acquire(1, "a")
+    assert org_slots.acquire(1, "b")
+    assert org_slots.renew(1, "c")
+    assert not client.keys()
+
+
+def test_heartbeat_renews_until_exit(client):
+    document_slots = IngestionSlots("document", limit=1, ttl=60, client=client)
+    assert document_slots.acquire(7, "a")
+    key = document_slots._key(7)
+    acquired_expiry = client.zscore(key, "a")
+    
+    heartbeat = LeaseHeartbeat([(document_slots, 7, "a")], interval=0.01)
+    with heartbeat:
+        deadline = time.monotonic() + 5
+        while client.zscore(key, "a") == acquired_expiry and time.monotonic() < deadline:
+            time.sleep(0.01)
+    
+    assert client.zscore(key, "a") > acquired_expiry    
+    assert not heartbeat._thread.is_alive()